@@ -0,0 +1,115 @@
+"""Audio onset index of a video, used by cut_rallies.py to snap rally marks to hits and whistles.
+
+The first audio stream is piped from ffmpeg as mono 16-bit PCM and reduced, chunk by chunk, to an RMS
+envelope with one value per HOP_SECONDS. Onsets are sharp rises of the log envelope that are local
+maxima and stand out from the rest of the match. Their times are cached next to the video as
+<video>.onsets.npz, keyed on the video's size and mtime.
+"""
+import numpy as np
+
+from ffmpeg_process import stream_ffmpeg
+from npz_cache import load_cached_npz, save_cached_npz, source_key
+
+
+ONSET_SUFFIX = '.onsets.npz'
+ONSET_VERSION = 1
+
+SAMPLE_RATE = 16000
+HOP_SECONDS = 0.01
+CHUNK_SECONDS = 10         # PCM read and reduced at once (320 KB)
+PEAK_SECONDS = 0.05        # An onset must be the strongest rise within this distance
+ONSET_SENSITIVITY = 4.0    # Rise must exceed the median by this many median absolute deviations
+
+# Marks snap to the nearest onset within this many seconds
+SNAP_WINDOW = 0.3
+
+
+class OnsetIndex:
+    """Sorted onset times of a video, in seconds."""
+
+    def __init__(self, times):
+        self.times = times
+
+    def __len__(self):
+        return len(self.times)
+
+    def nearest(self, seconds, window=SNAP_WINDOW):
+        """The onset closest to seconds if it is within window, else None."""
+        i = np.searchsorted(self.times, seconds)
+        candidates = self.times[max(0, i - 1):i + 1]
+        if len(candidates) == 0:
+            return None
+        best = candidates[np.argmin(np.abs(candidates - seconds))]
+        return float(best) if abs(best - seconds) <= window else None
+
+
+def onset_path(video_path):
+    return video_path + ONSET_SUFFIX
+
+
+def audio_envelope(video_path):
+    """RMS of every HOP_SECONDS of the first audio stream, mixed down to mono."""
+    cmd = [
+        'ffmpeg',
+        '-loglevel', 'error',
+        '-i', video_path,
+        '-map', '0:a:0',
+        '-vn', '-sn',
+        '-ac', '1',
+        '-ar', str(SAMPLE_RATE),
+        '-f', 's16le',
+        'pipe:'
+    ]
+    hop = int(SAMPLE_RATE * HOP_SECONDS)
+    chunk_bytes = int(SAMPLE_RATE * CHUNK_SECONDS) * 2
+    envelope = []
+    for data in stream_ffmpeg(cmd, chunk_bytes):
+        hops = len(data) // (2 * hop)
+        if hops == 0:
+            continue  # The last partial hop is dropped
+        samples = np.frombuffer(data, dtype=np.int16, count=hops * hop).astype(np.float32)
+        envelope.append(np.sqrt(np.mean(np.square(samples.reshape(hops, hop)), axis=1)))
+    return np.concatenate(envelope) if envelope else np.zeros(0, dtype=np.float32)
+
+
+def detect_onsets(envelope):
+    """Onset times in seconds from an RMS envelope."""
+    if len(envelope) < 3:
+        return np.zeros(0)
+    # Positive change of the log energy: loudness-independent, only rises count
+    strength = np.maximum(np.diff(np.log(envelope + 1.0)), 0)
+    median = np.median(strength)
+    mad = np.median(np.abs(strength - median)) or 1e-6
+    candidates = strength > median + ONSET_SENSITIVITY * mad
+
+    # Keep only the strongest rise within PEAK_SECONDS
+    radius = max(1, int(PEAK_SECONDS / HOP_SECONDS))
+    padded = np.pad(strength, radius, mode='constant')
+    local_max = np.lib.stride_tricks.sliding_window_view(padded, 2 * radius + 1).max(axis=1)
+    peaks = np.flatnonzero(candidates & (strength >= local_max))
+    # strength[i] is the rise from hop i to hop i + 1
+    return (peaks + 1) * HOP_SECONDS
+
+
+def build_onset_index(video_path):
+    return OnsetIndex(detect_onsets(audio_envelope(video_path)))
+
+
+def load_onset_index(video_path):
+    """Return the cached index of video_path, or None if there is none or it is out of date."""
+    data = load_cached_npz(onset_path(video_path), source_key(video_path, ONSET_VERSION))
+    return OnsetIndex(data['times']) if data is not None else None
+
+
+def save_onset_index(video_path, index):
+    """Cache the index next to the video."""
+    save_cached_npz(onset_path(video_path), source_key(video_path, ONSET_VERSION), times=index.times)
+
+
+def get_onset_index(video_path):
+    """Load the cached onset index of video_path, building and caching it if needed."""
+    index = load_onset_index(video_path)
+    if index is None:
+        index = build_onset_index(video_path)
+        save_onset_index(video_path, index)
+    return index
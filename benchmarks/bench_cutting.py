@@ -0,0 +1,232 @@
+"""Offline benchmark for the video_cutting pipeline.
+
+Generates synthetic match directories with ffmpeg's lavfi test sources, writes matching
+rally_labels.csv files and runs video_cutting.py under several worker counts and cut modes.
+Every run reports throughput (segment-seconds per wall-second), peak RSS and bytes read, and can
+be compared against a stored baseline JSON to gate performance regressions.
+
+Example:
+    python benchmarks/bench_cutting.py --workers 1,4 --modes reencode,smart --baseline benchmarks/baseline.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CUTTER = os.path.join(REPO_DIR, 'video_cutting.py')
+
+sys.path.insert(0, REPO_DIR)
+from rally_labels import make_rally_label, write_rally_labels  # noqa: E402
+
+# One lavfi pattern per camera view so the views do not compress identically
+VIEW_SOURCES = ['testsrc2', 'smptehdbars', 'rgbtestsrc', 'mandelbrot']
+
+
+def generate_view(path, source, duration, resolution, fps, gop):
+    """Encode a synthetic H.264/AAC camera view with a fixed GOP size."""
+    cmd = [
+        'ffmpeg',
+        '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f"{source}=size={resolution}:rate={fps}:duration={duration}",
+        '-f', 'lavfi', '-i', f"sine=frequency=440:sample_rate=48000:duration={duration}",
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p',
+        '-g', str(gop), '-keyint_min', str(gop), '-sc_threshold', '0',
+        '-c:a', 'aac', '-b:a', '128k',
+        '-shortest',
+        '-y', path
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def generate_rallies(duration, fps, rally_count, seed):
+    """Spread rally_count non-overlapping rallies of 3-20 s over the match, deterministically."""
+    rng = random.Random(seed)
+    slot = duration / rally_count
+    rallies = []
+    for i in range(rally_count):
+        length = min(slot * 0.8, rng.uniform(3.0, 20.0))
+        start = i * slot + rng.uniform(0, slot - length)
+        start_frame = int(start * fps)
+        end_frame = int((start + length) * fps)
+        rallies.append((start_frame, end_frame))
+    return rallies
+
+
+def generate_dataset(base_dir, matches, views, duration, resolution, fps, gop, rally_count, seed=0):
+    """Create <base_dir>/matchN/{1..views}.mp4 + rally_labels.csv and return the total segment seconds."""
+    segment_seconds = 0.0
+    for m in range(1, matches + 1):
+        match_dir = os.path.join(base_dir, f"match{m}")
+        os.makedirs(match_dir, exist_ok=True)
+        for v in range(1, views + 1):
+            source = VIEW_SOURCES[(v - 1) % len(VIEW_SOURCES)]
+            generate_view(os.path.join(match_dir, f"{v}.mp4"), source, duration, resolution, fps, gop)
+        rallies = generate_rallies(duration, fps, rally_count, seed + m)
+        labels = [make_rally_label(i + 1, start, end, fps) for i, (start, end) in enumerate(rallies)]
+        write_rally_labels(os.path.join(match_dir, 'rally_labels.csv'), labels)
+        segment_seconds += views * sum((end - start) / fps for start, end in rallies)
+    return segment_seconds
+
+
+def measure(cmd):
+    """Run cmd as a child of this (fresh) process and print its resource usage as JSON.
+
+    Called through `bench_cutting.py _measure -- <cmd>` so RUSAGE_CHILDREN and /proc/self/io only
+    cover one benchmark run: the cutter, its pool workers and every ffmpeg they spawned.
+    """
+    def read_io():
+        try:
+            with open('/proc/self/io') as f:
+                return {key: int(value) for key, value in (line.split(':') for line in f if ':' in line)}
+        except OSError:
+            return {}
+
+    start_io = read_io()
+    started = time.perf_counter()
+    returncode = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+    wall_time = time.perf_counter() - started
+    end_io = read_io()
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    print(json.dumps({
+        'returncode': returncode,
+        'wall_time': wall_time,
+        'cpu_time': usage.ru_utime + usage.ru_stime,
+        'peak_rss_mb': usage.ru_maxrss / 1024,  # ru_maxrss is in KiB on Linux
+        'bytes_read': end_io.get('rchar', 0) - start_io.get('rchar', 0),
+        'disk_bytes_read': end_io.get('read_bytes', 0) - start_io.get('read_bytes', 0),
+    }))
+    return returncode
+
+
+def run_config(base_dir, work_dir, segment_seconds, workers, mode, fanout):
+    """Cut the whole dataset from scratch with one configuration and return its measurements."""
+    output_dir = os.path.join(work_dir, 'output')
+    shutil.rmtree(output_dir, ignore_errors=True)
+    cache_file = os.path.join(work_dir, 'journal.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(cache_file + suffix):
+            os.remove(cache_file + suffix)
+
+    cmd = [
+        sys.executable, CUTTER,
+        '--base_dir', base_dir,
+        '--output_dir', output_dir,
+        '--workers', str(workers),
+        '--cache_file', cache_file,
+        '--cut_mode', mode,
+    ]
+    if fanout:
+        cmd.append('--fanout')
+
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '_measure', '--', *cmd],
+        check=True, stdout=subprocess.PIPE, text=True, cwd=work_dir
+    )
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+    if stats['returncode'] != 0:
+        raise RuntimeError(f"video_cutting.py exited with {stats['returncode']} for {cmd}")
+    stats['throughput'] = segment_seconds / stats['wall_time']
+    return stats
+
+
+def config_name(workers, mode, fanout):
+    return f"{mode}{'+fanout' if fanout else ''}/w{workers}"
+
+
+def compare(results, baseline, tolerance):
+    """Print the throughput change per configuration and return the names that regressed."""
+    regressions = []
+    for name, stats in results.items():
+        reference = baseline.get('results', {}).get(name)
+        if reference is None:
+            print(f"  {name}: no baseline")
+            continue
+        change = stats['throughput'] / reference['throughput'] - 1
+        flag = ''
+        if change < -tolerance:
+            regressions.append(name)
+            flag = '  <-- REGRESSION'
+        print(f"  {name}: {reference['throughput']:.2f} -> {stats['throughput']:.2f} seg-s/s ({change:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '_measure':
+        sys.exit(measure(sys.argv[sys.argv.index('--') + 1:]))
+
+    parser = argparse.ArgumentParser(description="Benchmark video_cutting.py on synthetic matches.")
+    parser.add_argument("--matches", type=int, default=1, help="Number of synthetic match directories")
+    parser.add_argument("--views", type=int, default=2, help="Camera views per match")
+    parser.add_argument("--duration", type=float, default=120, help="Length of each view in seconds")
+    parser.add_argument("--resolution", default="1280x720", help="Resolution of the synthetic views")
+    parser.add_argument("--fps", type=int, default=30, help="Frame rate of the synthetic views")
+    parser.add_argument("--gop", type=int, default=60, help="GOP size (keyframe interval in frames)")
+    parser.add_argument("--rallies", type=int, default=8, help="Rallies per match")
+    parser.add_argument("--workers", default="1,4", help="Comma-separated worker counts to run")
+    parser.add_argument("--modes", default="reencode,copy,smart", help="Comma-separated cut modes to run")
+    parser.add_argument("--fanout", action="store_true", help="Also run re-encode mode with --fanout")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per configuration (best run is kept)")
+    parser.add_argument("--work_dir", default=None, help="Keep the dataset and outputs here instead of a temp dir")
+    parser.add_argument("--baseline", default=None, help="Baseline JSON to compare against")
+    parser.add_argument("--save_baseline", default=None, help="Write the results as a new baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Allowed throughput drop against the baseline before failing (default: 0.15)")
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='cutrallies_bench_')
+    base_dir = os.path.join(work_dir, 'matches')
+    dataset = {
+        'matches': args.matches, 'views': args.views, 'duration': args.duration, 'resolution': args.resolution,
+        'fps': args.fps, 'gop': args.gop, 'rallies': args.rallies,
+    }
+
+    try:
+        print(f"Generating dataset in {base_dir}: {dataset}")
+        segment_seconds = generate_dataset(base_dir, args.matches, args.views, args.duration, args.resolution,
+                                           args.fps, args.gop, args.rallies)
+
+        configs = [(int(w), mode, False) for mode in args.modes.split(',') for w in args.workers.split(',')]
+        if args.fanout:
+            configs += [(int(w), 'reencode', True) for w in args.workers.split(',')]
+
+        results = {}
+        for workers, mode, fanout in configs:
+            name = config_name(workers, mode, fanout)
+            runs = [run_config(base_dir, work_dir, segment_seconds, workers, mode, fanout) for _ in range(args.repeat)]
+            results[name] = max(runs, key=lambda r: r['throughput'])
+            stats = results[name]
+            print(f"{name}: {stats['throughput']:.2f} seg-s/s, wall {stats['wall_time']:.2f}s, "
+                  f"cpu {stats['cpu_time']:.2f}s, peak RSS {stats['peak_rss_mb']:.0f} MB, "
+                  f"read {stats['bytes_read'] / 1e6:.1f} MB")
+
+        report = {'dataset': dataset, 'segment_seconds': segment_seconds, 'results': results}
+        if args.save_baseline:
+            with open(args.save_baseline, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"Saved baseline to {args.save_baseline}")
+
+        if args.baseline:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            if baseline.get('dataset') != dataset:
+                print(f"Warning: baseline was recorded on a different dataset: {baseline.get('dataset')}")
+            print(f"Comparing against {args.baseline}:")
+            regressions = compare(results, baseline, args.tolerance)
+            if regressions:
+                print(f"Throughput regressed by more than {args.tolerance:.0%} for: {', '.join(regressions)}")
+                sys.exit(1)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
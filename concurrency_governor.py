@@ -0,0 +1,130 @@
+import os
+import time
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two decisions
+GOVERNOR_INTERVAL = 5
+# Decisions that keep the limit are logged when their reason changes, otherwise at most this often
+GOVERNOR_LOG_INTERVAL = 60
+
+# Thresholds; memory is MemAvailable / MemTotal, iowait and idle are fractions of all CPU time
+MEM_LOW = 0.10         # Shrink below this, cutting a quarter of the slots (swapping is far worse than idling)
+MEM_OK = 0.20          # Grow only above this
+IOWAIT_HIGH = 0.25     # Shrink above this: more concurrent readers only add seeks
+IOWAIT_OK = 0.10
+RUNQUEUE_HIGH = 1.5    # Shrink above this many runnable threads per CPU while the CPUs are saturated
+IDLE_LOW = 0.05
+IDLE_OK = 0.20         # Grow only while at least this much CPU time is idle
+COOLDOWN_INTERVALS = 2 # Intervals after a shrink before growing again
+
+
+def read_cpu_times():
+    """(total, idle, iowait) jiffies summed over all CPUs, and the number of runnable threads, from /proc/stat."""
+    times = None
+    procs_running = 0
+    with open('/proc/stat') as f:
+        for line in f:
+            if line.startswith('cpu '):
+                values = [int(v) for v in line.split()[1:]]
+                # user nice system idle iowait irq softirq steal (guest time is already in user/nice)
+                times = (sum(values[:8]), values[3], values[4])
+            elif line.startswith('procs_running'):
+                procs_running = int(line.split()[1])
+    return times, procs_running
+
+
+def read_mem_available():
+    """MemAvailable / MemTotal from /proc/meminfo."""
+    meminfo = {}
+    with open('/proc/meminfo') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            meminfo[key] = int(value.split()[0])
+    return meminfo['MemAvailable'] / meminfo['MemTotal']
+
+
+class ConcurrencyGovernor:
+    """Adjusts the number of in-flight ffmpeg tasks between min_workers and max_workers.
+
+    Every `interval` seconds, limit(running) samples memory, I/O wait and the run queue from /proc
+    and shrinks the limit under pressure, or grows it by one while the host has headroom. Callers only
+    ask while work is waiting to start. Tasks already running are never stopped, a lower limit only
+    delays new ones.
+    """
+
+    def __init__(self, min_workers, max_workers, interval=GOVERNOR_INTERVAL):
+        self.min_workers = max(1, min(min_workers, max_workers))
+        self.max_workers = max_workers
+        self.interval = interval
+        self.current = self.min_workers
+        self.cpu_count = os.cpu_count() or 1
+        self.last_sample = time.monotonic()
+        self.cooldown = 0
+        self.last_logged = (None, 0.0)  # (reason, monotonic time) of the last logged unchanged limit
+        self.prev_times, _ = read_cpu_times()
+        logger.info(f"Adaptive concurrency: starting with {self.current} tasks (range {self.min_workers}-{self.max_workers})")
+
+    def limit(self, running):
+        """Current number of tasks that may run; re-evaluated at most once per interval."""
+        now = time.monotonic()
+        if now - self.last_sample >= self.interval:
+            self.last_sample = now
+            self.decide(running)
+        return self.current
+
+    def decide(self, running):
+        times, procs_running = read_cpu_times()
+        mem_available = read_mem_available()
+        total = times[0] - self.prev_times[0]
+        idle = (times[1] - self.prev_times[1]) / total if total > 0 else 1.0
+        iowait = (times[2] - self.prev_times[2]) / total if total > 0 else 0.0
+        self.prev_times = times
+        # procs_running counts this process too
+        runqueue = max(procs_running - 1, 0) / self.cpu_count
+
+        state = (f"mem available {mem_available:.0%}, iowait {iowait:.0%}, idle {idle:.0%}, "
+                 f"run queue {runqueue:.2f}/CPU, load {os.getloadavg()[0]:.1f}, {running} running")
+        previous = self.current
+        if mem_available < MEM_LOW:
+            self.current = max(self.min_workers, self.current - max(1, self.current // 4))
+            reason = "memory pressure"
+        elif iowait > IOWAIT_HIGH:
+            self.current = max(self.min_workers, self.current - 1)
+            reason = "disk I/O wait"
+        elif idle < IDLE_LOW and runqueue > RUNQUEUE_HIGH:
+            self.current = max(self.min_workers, self.current - 1)
+            reason = "CPU overload"
+        elif self.cooldown > 0:
+            self.cooldown -= 1
+            reason = "cooling down after shrinking"
+        elif mem_available > MEM_OK and iowait < IOWAIT_OK and idle > IDLE_OK:
+            self.current = min(self.max_workers, self.current + 1)
+            reason = "idle capacity"
+        else:
+            reason = "steady"
+
+        if self.current < previous:
+            self.cooldown = COOLDOWN_INTERVALS
+        if self.current != previous:
+            logger.info(f"Concurrency {previous} -> {self.current} ({reason}: {state})")
+            self.last_logged = (None, 0.0)
+            return
+        now = time.monotonic()
+        last_reason, last_time = self.last_logged
+        if reason != last_reason or now - last_time >= GOVERNOR_LOG_INTERVAL:
+            logger.info(f"Concurrency stays at {self.current} ({reason}: {state})")
+            self.last_logged = (reason, now)
+        else:
+            logger.debug(f"Concurrency stays at {self.current} ({reason}: {state})")
+
+
+def create_governor(min_workers, max_workers, interval=GOVERNOR_INTERVAL):
+    """Return a ConcurrencyGovernor, or None where /proc cannot be read (a fixed limit is used then)."""
+    try:
+        return ConcurrencyGovernor(min_workers, max_workers, interval)
+    except (OSError, KeyError, ValueError, TypeError) as e:
+        logger.warning(f"Adaptive concurrency unavailable ({e}), running {max_workers} tasks at a time")
+        return None
@@ -1,14 +1,163 @@
-import cv2
 import tkinter as tk
 from tkinter import filedialog, ttk
-import csv
 import os
-import numpy as np
-from PIL import Image, ImageTk
+import math
+import queue
+import argparse
+import threading
+import time
 import datetime
 
+from labeling_core import RallyMarkers
+from rally_labels import RallyLabelError, frame_to_time
+from proxy_video import ProxyBuild, load_proxy
+
+# cv2、numpy、PIL 與各個分析模組在加載影片時才匯入，視窗可以立即出現
+
+# 已解碼幀快取的預設記憶體上限 (MB)，與 frame_decoder.CACHE_MB 相同
+DEFAULT_CACHE_MB = 512
+
+# 縮圖列下方標示回合範圍的色帶高度
+FILMSTRIP_MARKER_HEIGHT = 6
+
+# 其他視角：解析度倍率 (1/倍率)，落後共同時鐘超過 VIEW_LAG_SECONDS 就降一級，準時 VIEW_RECOVER_SECONDS 後升回一級
+VIEW_LEVELS = (1, 2, 4)
+VIEW_LAG_SECONDS = 0.2
+VIEW_RECOVER_SECONDS = 3
+VIEW_LEVEL_HOLD_SECONDS = 1  # 調整解析度後至少維持這麼久，等新尺寸的幀生效
+VIEW_PREFETCH_FRAMES = 8
+
+
+def scale_to_fit(width, height, box_width, box_height):
+    # 保持寬高比縮放到框內的尺寸
+    scale = min(box_width / max(1, width), box_height / max(1, height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def prepare_display_frame(frame, size, buffers):
+    # 在解碼執行緒中執行，不可呼叫 Tk
+    import cv2
+    import numpy as np
+    width, height = size
+    
+    # 先縮小再轉換色彩空間，只需轉換縮小後的像素；縮小用的緩衝區重複使用
+    # (每個執行緒各一份，切換代理影片時新舊解碼執行緒可能短暫同時執行)
+    buffer = getattr(buffers, 'resized', None)
+    if buffer is None or buffer.shape[:2] != (height, width):
+        buffer = np.empty((height, width, 3), dtype=np.uint8)
+        buffers.resized = buffer
+    cv2.resize(frame, (width, height), dst=buffer)
+    
+    # 轉換顏色空間從BGR到RGB；結果會放進緩衝區與快取，所以每幀各一份
+    return cv2.cvtColor(buffer, cv2.COLOR_BGR2RGB)
+
+
+def show_image(label, photo, frame_rgb):
+    # 同一張 PhotoImage 原地更新，只有尺寸改變時才重新建立；置中由 Label 負責，不需補黑邊
+    from PIL import Image, ImageTk
+    img = Image.fromarray(frame_rgb)
+    height, width = frame_rgb.shape[:2]
+    if photo is None or (photo.width(), photo.height()) != (width, height):
+        photo = ImageTk.PhotoImage(image=img)
+        label.configure(image=photo)
+    else:
+        photo.paste(img)
+    return photo
+
+
+def open_decoder(video_path, prepare, buffer_size, cache_mb):
+    # 有相符的代理影片時改用代理影片 (幀數與 FPS 必須和原始影片相同)
+    from frame_decoder import FrameDecoder
+    decoder = FrameDecoder(video_path, prepare, buffer_size=buffer_size, cache_mb=cache_mb)
+    proxy_path = load_proxy(video_path)
+    if proxy_path is None or not decoder.is_opened():
+        return decoder
+    proxy = FrameDecoder(proxy_path, prepare, buffer_size=buffer_size, cache_mb=cache_mb)
+    if proxy.is_opened() and proxy.total_frames == decoder.total_frames and abs(proxy.fps - decoder.fps) <= 1e-3:
+        decoder.close()
+        return proxy
+    proxy.close()
+    return decoder
+
+
+class SecondaryView:
+    # 同一場比賽的其他視角：各自的解碼執行緒，跟隨主視角的時間顯示（各視角的幀率與幀數可能不同）
+    def __init__(self, video_path, label, cache_mb):
+        self.video_path = video_path
+        self.label = label
+        self.photo = None
+        self.prepare_buffers = threading.local()
+        self.tile_size = (1, 1)
+        self.scaled_size = (1, 1)
+        self.level = 0  # VIEW_LEVELS 的索引，0 為完整解析度
+        self.level_changed = 0.0
+        self.on_time_since = None
+        self.shown_frame = None  # 最後顯示的幀號
+        self.decoder = open_decoder(video_path, self.prepare, VIEW_PREFETCH_FRAMES, cache_mb)
+        
+    def set_tile_size(self, width, height):
+        self.tile_size = (width, height)
+        self.update_scaled_size()
+        
+    def update_scaled_size(self):
+        width, height = scale_to_fit(self.decoder.width, self.decoder.height, *self.tile_size)
+        factor = VIEW_LEVELS[self.level]
+        self.scaled_size = (max(1, width // factor), max(1, height // factor))
+        
+    def prepare(self, frame):
+        return prepare_display_frame(frame, self.scaled_size, self.prepare_buffers)
+        
+    def view_frame(self, frame_num, fps):
+        # 主視角的幀號經由時間換算成本視角的幀號
+        if fps and self.decoder.fps:
+            frame_num = round(frame_num / fps * self.decoder.fps)
+        return max(0, min(frame_num, self.decoder.total_frames - 1))
+        
+    def seek(self, frame_num, fps, flush=False):
+        frame_num = self.view_frame(frame_num, fps)
+        self.decoder.seek(frame_num, flush)
+        # 定位後從新位置重新計算落後多少
+        self.shown_frame = frame_num
+        
+    def display(self, frame_rgb):
+        self.photo = show_image(self.label, self.photo, frame_rgb)
+        
+    def play_tick(self, target, primary_late, fps):
+        # 播放時每次更新呼叫：取出應顯示的幀，依是否跟得上調整解析度
+        target = self.view_frame(target, fps)
+        frame_num, image = self.decoder.take(target)
+        if image is not None:
+            self.display(image)
+            self.shown_frame = frame_num
+            
+        now = time.perf_counter()
+        lag = target - self.shown_frame if self.shown_frame is not None else target
+        late = primary_late or lag > VIEW_LAG_SECONDS * (self.decoder.fps or fps)
+        if now - self.level_changed < VIEW_LEVEL_HOLD_SECONDS:
+            return
+        if late:
+            self.on_time_since = None
+            if self.level < len(VIEW_LEVELS) - 1:
+                self.change_level(self.level + 1, now)
+        elif self.on_time_since is None:
+            self.on_time_since = now
+        elif self.level > 0 and now - self.on_time_since >= VIEW_RECOVER_SECONDS:
+            self.change_level(self.level - 1, now)
+            self.on_time_since = now
+            
+    def change_level(self, level, now):
+        # 只影響之後準備的幀，已在緩衝區中的幀照常顯示
+        self.level = level
+        self.level_changed = now
+        self.update_scaled_size()
+        
+    def close(self):
+        self.decoder.close()
+        self.label.destroy()
+
+
 class RallyCutterApp:
-    def __init__(self, root):
+    def __init__(self, root, cache_mb=DEFAULT_CACHE_MB, use_proxy=True, debug=False, multi_view=True):
         self.root = root
         self.root.title("Rally Cutter Tool")
         # self.root.geometry("2000x1600")
@@ -16,13 +165,37 @@ class RallyCutterApp:
         
         # 影片變量
         self.video_path = None
-        self.cap = None
+        self.decoder = None  # 在背景執行緒中解碼並預先準備好要顯示的幀
+        self.cache_mb = cache_mb  # 已解碼幀快取的記憶體上限
+        self.use_proxy = use_proxy
+        self.proxy_build = None  # 背景產生中的低解析度代理影片
+        self.using_proxy = False  # 目前是否從代理影片解碼
+        self.thumbs = None  # 縮圖 (數量, 高, 寬, 3)，記憶體映射自快取檔
+        self.thumb_build = None  # 背景產生中的縮圖
+        self.thumb_step = 1  # 相鄰縮圖間隔的幀數
+        self.filmstrip_first = None  # 縮圖列最左邊顯示的縮圖
+        self.filmstrip_width = 0
+        self.multi_view = multi_view
+        self.views = []  # 同一資料夾中其他視角的 SecondaryView，與主視角同步播放
+        self.motion_worker = None  # 分析畫面動態、建議回合的子程序
+        self.motion_queue = None
         self.total_frames = 0
         self.fps = 0
         self.current_frame = 0
         self.play_status = False
-        self.rally_markers = []  # 存儲格式: [{'start_frame': x, 'end_frame': y, 'start_time': 'xx:xx:xx', 'end_time': 'xx:xx:xx'}]
-        self.current_rally = None  # 當前正在標記的回合
+        self.index_queue = queue.Queue()  # 背景建立的關鍵幀/PTS 索引
+        self.onset_index = None  # 擊球聲/哨聲等聲音起始點，於背景建立
+        self.onset_queue = queue.Queue()
+        self.play_start = None  # 播放開始時的 (時間, 幀號)，用來依 FPS 計時
+        self.display_request = 0  # 每次定位加一，舊的顯示請求就會放棄
+        self.display_width = 800
+        self.display_height = 600
+        self.scaled_size = (800, 600)  # 影片縮放後的顯示尺寸，只在視窗大小改變時更新
+        self.prepare_buffers = threading.local()  # 解碼執行緒重複使用的縮放緩衝區
+        self.photo = None  # 持續使用的 PhotoImage
+        self.prepare_ms = 0.0  # 最近一幀在解碼執行緒中的準備時間
+        self.debug_overlay = debug  # 顯示每幀的處理時間 (F12 切換)
+        self.markers = RallyMarkers(0)  # 回合標記與尚未結束的回合，不依賴介面
         self.video_width = 1600  # 默認影片寬度
         self.video_height = 1500  # 默認影片高度
         
@@ -65,6 +238,10 @@ class RallyCutterApp:
         export_btn = ttk.Button(control_frame, text="導出CSV (E)", command=self.export_csv)
         export_btn.pack(side=tk.LEFT, padx=5)
         
+        # 導入CSV按鈕，繼續編輯之前導出的標記
+        import_btn = ttk.Button(control_frame, text="導入CSV", command=self.import_csv)
+        import_btn.pack(side=tk.LEFT, padx=5)
+        
         # 播放/暫停按鈕
         self.play_btn = ttk.Button(control_frame, text="播放 (P)", command=self.toggle_play)
         self.play_btn.pack(side=tk.LEFT, padx=5)
@@ -81,18 +258,48 @@ class RallyCutterApp:
         self.mark_btn = ttk.Button(control_frame, text="標記回合結束 (D)", command=self.end_marker)
         self.mark_btn.pack(side=tk.LEFT, padx=5)
         
+        # 自動建議回合，以及接受/拒絕表格中選取的建議
+        propose_btn = ttk.Button(control_frame, text="自動建議回合", command=self.propose_rallies)
+        propose_btn.pack(side=tk.LEFT, padx=5)
+        
+        accept_btn = ttk.Button(control_frame, text="接受建議", command=self.accept_proposals)
+        accept_btn.pack(side=tk.LEFT, padx=5)
+        
+        reject_btn = ttk.Button(control_frame, text="拒絕建議", command=self.reject_proposals)
+        reject_btn.pack(side=tk.LEFT, padx=5)
+        
+        # S/D 標記時吸附到最近的聲音起始點
+        self.snap_var = tk.BooleanVar(value=False)
+        snap_check = ttk.Checkbutton(control_frame, text="吸附到擊球聲", variable=self.snap_var)
+        snap_check.pack(side=tk.LEFT, padx=5)
+        
         # Video 區域
         self.video_frame = ttk.Frame(main_frame, borderwidth=2, relief="groove")
         self.video_frame.grid(row=1, column=0, sticky="nsew", pady=5)
         
         # Video 顯示標籤
-        self.video_label = ttk.Label(self.video_frame)
-        self.video_label.pack(fill=tk.BOTH, expand=True)
+        self.video_label = ttk.Label(self.video_frame, anchor=tk.CENTER, background="black")
+        self.video_label.grid(row=0, column=0, sticky="nsew")
+        self.video_frame.grid_rowconfigure(0, weight=1)
+        self.video_frame.grid_columnconfigure(0, weight=1)
+        
+        # 除錯用的處理時間顯示
+        self.debug_var = tk.StringVar()
+        self.debug_label = ttk.Label(self.video_frame, textvariable=self.debug_var,
+                                     foreground="lime", background="black")
+        if self.debug_overlay:
+            self.debug_label.place(x=5, y=5)
         
         # 進度條
         progress_frame = ttk.Frame(main_frame)
         progress_frame.grid(row=2, column=0, sticky="ew", pady=5)
         
+        # 縮圖列，點擊縮圖跳轉
+        self.filmstrip = tk.Canvas(progress_frame, height=FILMSTRIP_MARKER_HEIGHT,
+                                   background="black", highlightthickness=0)
+        self.filmstrip.pack(fill=tk.X, padx=5, pady=(0, 5))
+        self.filmstrip.bind('<Button-1>', self.on_filmstrip_click)
+        
         self.progress_var = tk.DoubleVar()
         self.progress_bar = ttk.Scale(
             progress_frame, 
@@ -140,6 +347,10 @@ class RallyCutterApp:
         self.marker_tree.column('start_frame', width=100)
         self.marker_tree.column('end_frame', width=100)
         
+        # 自動建議、尚未確認的回合以橘色顯示，雙擊跳到回合開始
+        self.marker_tree.tag_configure('proposed', foreground="darkorange")
+        self.marker_tree.bind('<Double-1>', self.on_marker_double_click)
+        
         # 添加 Slider
         marker_scroll = ttk.Scrollbar(markers_frame, orient=tk.VERTICAL, command=self.marker_tree.yview)
         self.marker_tree.configure(yscrollcommand=marker_scroll.set)
@@ -161,9 +372,16 @@ class RallyCutterApp:
         help_label.pack(padx=5, pady=5)
         
         # 狀態欄
+        status_frame = ttk.Frame(main_frame)
+        status_frame.grid(row=6, column=0, sticky="ew", pady=5)
         self.status_var = tk.StringVar()
-        status_bar = ttk.Label(main_frame, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
-        status_bar.grid(row=6, column=0, sticky="ew", pady=5)
+        status_bar = ttk.Label(status_frame, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
+        status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
+        # 幀快取命中率
+        self.cache_var = tk.StringVar()
+        cache_label = ttk.Label(status_frame, textvariable=self.cache_var, relief=tk.SUNKEN, anchor=tk.E)
+        cache_label.pack(side=tk.RIGHT, padx=(5, 0))
 
         # 更新初始狀態
         self.update_status("歡迎使用Rally切割工具。請加載影片。")
@@ -171,14 +389,65 @@ class RallyCutterApp:
     def on_window_resize(self, event):
         if event.widget == self.root:
             # 更新顯示尺寸
-            self.display_width = max(1, self.video_frame.winfo_width())
-            self.display_height = max(1, self.video_frame.winfo_height())
-            
-            if self.cap is not None and self.current_frame >= 0:
-                self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.current_frame)
-                ret, frame = self.cap.read()
-                if ret:
-                    self.display_frame(frame)
+            sizes = [self.scaled_size] + [view.scaled_size for view in self.views]
+            self.update_display_size()
+            
+            # 緩衝區中的幀是舊的尺寸，清空後重新解碼目前的幀
+            if self.decoder is not None and sizes != [self.scaled_size] + [view.scaled_size for view in self.views]:
+                self.seek_frame(self.current_frame, flush=True)
+                self.draw_filmstrip()
+                
+    def update_display_size(self):
+        # 多視角時每個視角佔一格
+        columns, rows = self.view_grid()
+        self.display_width = max(1, self.video_frame.winfo_width() // columns)
+        self.display_height = max(1, self.video_frame.winfo_height() // rows)
+        
+        # 縮放後的尺寸只在這裡計算，保持寬高比
+        self.scaled_size = scale_to_fit(self.video_width, self.video_height, self.display_width, self.display_height)
+        for view in self.views:
+            view.set_tile_size(self.display_width, self.display_height)
+            
+    def view_grid(self):
+        count = 1 + len(self.views)
+        columns = math.ceil(math.sqrt(count))
+        return columns, math.ceil(count / columns)
+        
+    def open_views(self, file_path):
+        # 打開同一資料夾中的其他視角 (1.mp4, 2.mp4, ...)
+        video_dir = os.path.dirname(file_path)
+        names = [name for name in os.listdir(video_dir)
+                 if name.endswith('.mp4') and os.path.join(video_dir, name) != file_path]
+        names.sort(key=lambda name: (not os.path.splitext(name)[0].isdigit(),
+                                     int(os.path.splitext(name)[0]) if os.path.splitext(name)[0].isdigit() else 0,
+                                     name))
+        
+        for name in names:
+            label = ttk.Label(self.video_frame, anchor=tk.CENTER, background="black")
+            view = SecondaryView(os.path.join(video_dir, name), label, max(1, self.cache_mb // 4))
+            if not view.decoder.is_opened():
+                view.close()
+                continue
+            self.views.append(view)
+            
+        # 主視角在左上，其餘依序排列，每格大小相同
+        columns, rows = self.view_grid()
+        for i, view in enumerate(self.views, start=1):
+            view.label.grid(row=i // columns, column=i % columns, sticky="nsew")
+        for row in range(rows):
+            self.video_frame.grid_rowconfigure(row, weight=1, uniform="view")
+        for column in range(columns):
+            self.video_frame.grid_columnconfigure(column, weight=1, uniform="view")
+            
+    def close_views(self):
+        columns, rows = self.view_grid()
+        for view in self.views:
+            view.close()
+        self.views = []
+        for row in range(1, rows):
+            self.video_frame.grid_rowconfigure(row, weight=0, uniform="")
+        for column in range(1, columns):
+            self.video_frame.grid_columnconfigure(column, weight=0, uniform="")
     
     def load_video(self):
         file_path = filedialog.askopenfilename(
@@ -191,142 +460,419 @@ class RallyCutterApp:
             
         # 重置所有狀態
         self.video_path = file_path
-        self.rally_markers = []
-        self.current_rally = None
+        self.markers = RallyMarkers(0)
         self.current_frame = 0
         self.play_status = False
         # self.mark_btn.configure(text="標記回合開始")
         
         
         # 清空表格
-        for i in self.marker_tree.get_children():
-            self.marker_tree.delete(i)
+        self.refresh_marker_tree()
+        self.cancel_motion_analysis()
+            
+        # 關閉上一個影片的解碼執行緒
+        if self.decoder is not None:
+            self.decoder.close()
+            self.decoder = None
+        self.close_views()
+        self.cancel_proxy_build()
+        self.using_proxy = False
+        self.cancel_thumbnail_build()
+        self.thumbs = None
+        self.filmstrip.delete('all')
             
         # 打開影片
-        self.cap = cv2.VideoCapture(file_path)
-        if not self.cap.isOpened():
+        from frame_decoder import FrameDecoder
+        decoder = FrameDecoder(file_path, self.prepare_frame, cache_mb=self.cache_mb)
+        if not decoder.is_opened():
             self.update_status("無法打開影片文件")
             return
+        self.decoder = decoder
             
         # 獲取影片信息
-        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
-        self.video_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        self.video_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.total_frames = decoder.total_frames
+        self.fps = decoder.fps
+        self.markers = RallyMarkers(self.fps)
+        self.video_width = decoder.width
+        self.video_height = decoder.height
         
-        # 設定固定的顯示尺寸（初始值）
-        self.display_width = 800
-        self.display_height = 600
+        # 其他視角
+        if self.multi_view:
+            self.open_views(file_path)
+        
+        # 解碼執行緒會依顯示尺寸準備幀，先取得目前的大小
+        self.update_display_size()
         
         # 更新進度條
         self.progress_bar.configure(to=self.total_frames-1)
         
         # 更新狀態
         video_name = os.path.basename(file_path)
-        self.update_status(f"已加載影片: {video_name} ({self.video_width}x{self.video_height}, {self.fps:.2f} FPS, {self.total_frames} 幀)")
+        self.update_status(f"已加載影片: {video_name} ({self.video_width}x{self.video_height}, {self.fps:.2f} FPS, {self.total_frames} 幀)"
+                           + (f"，同步顯示其他 {len(self.views)} 個視角" if self.views else ""))
+        
+        # 在背景建立(或讀取快取的)關鍵幀索引，完成前使用一般定位方式
+        threading.Thread(target=self.build_frame_index, args=(file_path,), daemon=True).start()
+        self.root.after(200, self.check_frame_index)
+        self.update_cache_status(decoder)
+        
+        # 聲音起始點索引，完成前標記不會吸附
+        self.onset_index = None
+        threading.Thread(target=self.build_onset_index, args=(file_path,), daemon=True).start()
+        self.root.after(500, self.check_onset_index)
         
         # 顯示第一幀
         self.seek_frame(0)
         self.update_time_display()
+        
+        # 縮圖列：讀取快取，沒有則在背景產生
+        self.start_filmstrip(file_path)
+        
+        # 有代理影片時改用代理影片，沒有則在背景產生
+        if self.use_proxy:
+            proxy_path = load_proxy(file_path)
+            if proxy_path is not None:
+                self.switch_to_proxy(proxy_path)
+            else:
+                self.start_proxy_build(file_path)
+            
+    def build_frame_index(self, video_path):
+        # 在背景執行緒中執行，結果交給主執行緒處理
+        try:
+            from frame_index import get_frame_index
+            index = get_frame_index(video_path)
+        except Exception as e:
+            index = e
+        self.index_queue.put((video_path, index))
+        
+    def check_frame_index(self):
+        try:
+            video_path, index = self.index_queue.get_nowait()
+        except queue.Empty:
+            self.root.after(200, self.check_frame_index)
+            return
+            
+        if video_path != self.video_path or self.decoder is None:
+            return  # 已改為加載其他影片
+        if isinstance(index, Exception):
+            self.update_status(f"無法建立關鍵幀索引，使用一般定位方式: {index}")
+            return
+            
+        # 代理影片每一幀都是關鍵幀，不需要原始影片的索引
+        if not self.using_proxy:
+            self.decoder.frame_index = index
+        self.update_status(f"關鍵幀索引已就緒: {len(index.keyframes)} 個關鍵幀")
+        
+    def start_filmstrip(self, video_path):
+        from filmstrip import ThumbnailBuild, load_thumbnails, thumb_layout
+        self.thumb_step, count, thumb_width, thumb_height = thumb_layout(
+            self.total_frames, self.fps, self.video_width, self.video_height)
+        shape = (count, thumb_height, thumb_width, 3)
+        
+        thumbs = load_thumbnails(video_path, shape)
+        if thumbs is None:
+            try:
+                self.thumb_build = ThumbnailBuild(video_path, self.thumb_step, shape)
+            except OSError as e:
+                self.update_status(f"無法產生縮圖: {e}")
+                return
+            thumbs = self.thumb_build.thumbs
+            self.root.after(500, self.check_thumbnail_build, self.thumb_build)
+            
+        self.thumbs = thumbs
+        self.filmstrip.configure(height=thumb_height + FILMSTRIP_MARKER_HEIGHT)
+        self.draw_filmstrip(redraw=True)
+        
+    def check_thumbnail_build(self, build):
+        if build is not self.thumb_build:
+            return  # 已取消或改為加載其他影片
+            
+        # 顯示目前已產生的縮圖
+        self.draw_filmstrip(redraw=True)
+        if not build.finished:
+            self.root.after(500, self.check_thumbnail_build, build)
+            return
+            
+        self.thumb_build = None
+        if build.error is not None:
+            self.update_status(f"產生縮圖失敗: {build.error}")
+            
+    def cancel_thumbnail_build(self):
+        if self.thumb_build is not None:
+            self.thumb_build.cancel()
+            self.thumb_build = None
+            
+    def draw_filmstrip(self, redraw=False):
+        if self.thumbs is None:
+            return
+        import numpy as np
+        from PIL import Image, ImageTk
+            
+        count, thumb_height, thumb_width, _ = self.thumbs.shape
+        width = max(1, self.filmstrip.winfo_width())
+        visible = min(count, width // thumb_width + 1)
+        
+        # 目前位置保持在中間，只有捲動或內容改變時才重畫縮圖
+        current = self.current_frame // self.thumb_step
+        first = max(0, min(current - visible // 2, count - visible))
+        if redraw or first != self.filmstrip_first or width != self.filmstrip_width:
+            self.filmstrip_first = first
+            self.filmstrip_width = width
+            
+            # 相鄰縮圖水平拼接成一張圖
+            strip = self.thumbs[first:first + visible].transpose(1, 0, 2, 3).reshape(thumb_height, -1, 3)
+            self.filmstrip_image = ImageTk.PhotoImage(image=Image.fromarray(np.ascontiguousarray(strip)))
+            self.filmstrip.delete('all')
+            self.filmstrip.create_image(0, 0, anchor=tk.NW, image=self.filmstrip_image)
+            self.draw_filmstrip_markers()
+            self.filmstrip.create_line(0, 0, 0, 0, fill="red", width=2, tags='cursor')
+            
+        x = self.filmstrip_x(self.current_frame)
+        self.filmstrip.coords('cursor', x, 0, x, thumb_height + FILMSTRIP_MARKER_HEIGHT)
+        
+    def filmstrip_x(self, frame_num):
+        return (frame_num / self.thumb_step - self.filmstrip_first) * self.thumbs.shape[2]
+        
+    def draw_filmstrip_markers(self):
+        if self.thumbs is None or self.filmstrip_first is None:
+            return
+            
+        self.filmstrip.delete('markers')
+        thumb_height = self.thumbs.shape[1]
+        ranges = [(m['start_frame'], m['end_frame'], "orange" if m.get('proposed') else "lime")
+                  for m in self.markers.markers]
+        if self.markers.current is not None:
+            # 尚未結束的回合只標示開始位置
+            start_frame = self.markers.current['start_frame']
+            ranges.append((start_frame, start_frame, "yellow"))
+            
+        for start_frame, end_frame, color in ranges:
+            x0 = self.filmstrip_x(start_frame)
+            x1 = max(self.filmstrip_x(end_frame), x0 + 2)
+            if x1 < 0 or x0 > self.filmstrip_width:
+                continue
+            # 半透明覆蓋縮圖，下方再加一條實心色帶
+            self.filmstrip.create_rectangle(x0, 0, x1, thumb_height, fill=color, outline=color,
+                                            stipple='gray25', tags='markers')
+            self.filmstrip.create_rectangle(x0, thumb_height, x1, thumb_height + FILMSTRIP_MARKER_HEIGHT,
+                                            fill=color, outline=color, tags='markers')
+        self.filmstrip.tag_raise('cursor')
+        
+    def on_filmstrip_click(self, event):
+        if self.decoder is None or self.thumbs is None or self.filmstrip_first is None:
+            return
+            
+        # 跳到被點擊縮圖所在的幀
+        index = self.filmstrip_first + int(event.x // self.thumbs.shape[2])
+        if index < len(self.thumbs):
+            self.seek_frame(index * self.thumb_step)
+            
+    def build_onset_index(self, video_path):
+        # 在背景執行緒中執行，結果交給主執行緒處理
+        try:
+            from audio_onsets import get_onset_index
+            index = get_onset_index(video_path)
+        except Exception as e:
+            index = e
+        self.onset_queue.put((video_path, index))
+        
+    def check_onset_index(self):
+        try:
+            video_path, index = self.onset_queue.get_nowait()
+        except queue.Empty:
+            self.root.after(500, self.check_onset_index)
+            return
+            
+        if video_path != self.video_path:
+            return  # 已改為加載其他影片
+        if isinstance(index, Exception):
+            self.update_status(f"無法建立聲音起始點索引 (影片可能沒有音訊)，標記不會吸附: {index}")
+            return
+            
+        self.onset_index = index
+        self.update_status(f"聲音起始點索引已就緒: {len(index)} 個起始點")
+        
+    def snap_to_onset(self):
+        # 開啟吸附時，把播放位置移到附近最近的聲音起始點；有移動時回傳 True
+        if not self.snap_var.get() or self.onset_index is None:
+            return False
+            
+        onset = self.onset_index.nearest(self.current_frame / self.fps)
+        if onset is None:
+            return False
+        frame_num = min(self.total_frames - 1, int(round(onset * self.fps)))
+        if frame_num == self.current_frame:
+            return False
+        self.seek_frame(frame_num)
+        return True
+        
+    def start_proxy_build(self, video_path):
+        try:
+            self.proxy_build = ProxyBuild(video_path)
+        except OSError as e:
+            self.update_status(f"無法產生代理影片，使用原始影片: {e}")
+            return
+        self.root.after(500, self.check_proxy_build, self.proxy_build)
+        
+    def check_proxy_build(self, build):
+        if build is not self.proxy_build:
+            return  # 已取消或改為加載其他影片
+            
+        try:
+            proxy_path = build.poll()
+        except (RuntimeError, OSError) as e:
+            self.proxy_build = None
+            self.update_status(f"產生代理影片失敗，使用原始影片: {e}")
+            return
+        if proxy_path is None:
+            self.root.after(500, self.check_proxy_build, build)
+            return
+            
+        self.proxy_build = None
+        self.switch_to_proxy(proxy_path)
+        
+    def cancel_proxy_build(self):
+        if self.proxy_build is not None:
+            self.proxy_build.cancel()
+            self.proxy_build = None
+            
+    def switch_to_proxy(self, proxy_path):
+        from frame_decoder import FrameDecoder
+        proxy = FrameDecoder(proxy_path, self.prepare_frame, cache_mb=self.cache_mb)
+        
+        # 幀號與 FPS 必須和原始影片一致，導出的幀號與時間才會正確
+        if not proxy.is_opened() or proxy.total_frames != self.total_frames or abs(proxy.fps - self.fps) > 1e-3:
+            proxy.close()
+            self.update_status(f"代理影片與原始影片不一致 ({proxy.total_frames} 幀, {proxy.fps:.2f} FPS)，繼續使用原始影片")
+            return
+            
+        self.decoder.close()
+        self.decoder = proxy
+        self.using_proxy = True
+        self.seek_frame(self.current_frame)
+        self.update_cache_status(proxy)
+        self.update_status(f"已切換至代理影片 ({proxy.width}x{proxy.height})，定位不需重新解碼")
             
     def toggle_play(self):
         self.play_status = not self.play_status
         
         if self.play_status:
             self.play_btn.configure(text="暫停")
+            # 如果已經到達最後一幀，循環回第一幀
+            if self.current_frame >= self.total_frames - 1:
+                self.seek_frame(0)
+            self.play_start = (time.perf_counter(), self.current_frame)
             self.play_video()
         else:
             self.play_btn.configure(text="播放")
             
     def play_video(self):
-        if self.cap is None or not self.play_status:
+        if self.decoder is None or not self.play_status:
             return
             
-        # 如果已經到達最後一幀，循環回第一幀
-        if self.current_frame >= self.total_frames - 1:
-            self.current_frame = 0
-            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-            
-        ret, frame = self.cap.read()
+        # 依實際經過的時間與 FPS 計算應顯示的幀，跟不上時跳過較舊的幀
+        start_time, start_frame = self.play_start
+        target = start_frame + int((time.perf_counter() - start_time) * self.fps)
+        frame_num, image = self.decoder.take(target)
         
-        if ret:
-            self.current_frame += 1
-            self.display_frame(frame)
+        if image is not None:
+            self.current_frame = frame_num
+            self.display_frame(image)
             self.progress_var.set(self.current_frame)
             self.update_time_display()
+            self.draw_filmstrip()
             
-            # 30毫秒後繼續顯示下一幀 (大約33 FPS)
-            self.root.after(30, self.play_video)
-        else:
+        # 其他視角跟隨同一個時鐘；主視角跟不上時，其他視角降低解析度讓出資源
+        primary_late = target - self.current_frame > VIEW_LAG_SECONDS * self.fps
+        for view in self.views:
+            view.play_tick(target, primary_late, self.fps)
+            
+        if image is None and self.decoder.at_end():
             self.play_status = False
             self.play_btn.configure(text="播放")
+            return
+            
+        # 在下一幀應顯示的時間再執行
+        next_time = start_time + (target + 1 - start_frame) / self.fps
+        delay = max(1, int((next_time - time.perf_counter()) * 1000))
+        self.root.after(delay, self.play_video)
             
-    def seek_frame(self, frame_num):
-        if self.cap is None:
+    def seek_frame(self, frame_num, flush=False):
+        if self.decoder is None:
             return
             
         # 確保幀數在有效範圍內
         frame_num = max(0, min(frame_num, self.total_frames - 1))
         
-        # 影片位置
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
-        ret, frame = self.cap.read()
+        self.current_frame = frame_num
+        self.progress_var.set(self.current_frame)
+        self.update_time_display()
+        self.draw_filmstrip()
         
-        if ret:
-            self.current_frame = frame_num
-            self.display_frame(frame)
-            self.progress_var.set(self.current_frame)
-            self.update_time_display()
+        # 由各視角的解碼執行緒同時定位並解碼，主執行緒不等待
+        self.decoder.seek(frame_num, flush)
+        for view in self.views:
+            view.seek(frame_num, self.fps, flush)
+            
+        if self.play_status:
+            self.play_start = (time.perf_counter(), frame_num)
+        else:
+            self.display_request += 1
+            self.show_when_ready(self.decoder, self.display_frame, frame_num, self.display_request)
+            for view in self.views:
+                self.show_when_ready(view.decoder, view.display, view.view_frame(frame_num, self.fps),
+                                     self.display_request)
+            
+    def show_when_ready(self, decoder, display, frame_num, request):
+        # 已有新的定位或開始播放時放棄
+        if self.play_status or request != self.display_request:
+            return
+            
+        found, image = decoder.take(frame_num)
+        if found == frame_num:
+            display(image)
+        elif not decoder.at_end():
+            self.root.after(5, self.show_when_ready, decoder, display, frame_num, request)
             
     def step_frames(self, step):
-        if self.cap is None:
+        if self.decoder is None:
             return
             
         target_frame = self.current_frame + step
         self.seek_frame(target_frame)
             
     def on_progress_change(self, value):
-        if self.cap is None:
+        if self.decoder is None:
             return
             
         frame_num = int(float(value))
         if frame_num != self.current_frame:
             self.seek_frame(frame_num)
             
-    def display_frame(self, frame):
-        if frame is None:
+    def prepare_frame(self, frame):
+        # 在解碼執行緒中執行，不可呼叫 Tk
+        start = time.perf_counter()
+        frame_rgb = prepare_display_frame(frame, self.scaled_size, self.prepare_buffers)
+        self.prepare_ms = (time.perf_counter() - start) * 1000
+        return frame_rgb
+        
+    def display_frame(self, frame_rgb):
+        # 主執行緒只負責把準備好的幀貼到畫面上
+        if frame_rgb is None:
             return
             
-        # 轉換顏色空間從BGR到RGB
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        # 動態獲取顯示區域大小
-        self.display_width = max(1, self.video_frame.winfo_width())
-        self.display_height = max(1, self.video_frame.winfo_height())
-        
-        # 計算縮放比例，保持寬高比
-        frame_h, frame_w = frame_rgb.shape[:2]
-        scale = min(self.display_width / frame_w, self.display_height / frame_h)
-        new_w, new_h = int(frame_w * scale), int(frame_h * scale)
-        frame_rgb = cv2.resize(frame_rgb, (new_w, new_h))
-        
-        # 如果縮放後的圖像小於顯示區域，居中顯示
-        if new_w < self.display_width or new_h < self.display_height:
-            canvas = np.zeros((self.display_height, self.display_width, 3), dtype=np.uint8)
-            x_offset = (self.display_width - new_w) // 2
-            y_offset = (self.display_height - new_h) // 2
-            canvas[y_offset:y_offset+new_h, x_offset:x_offset+new_w] = frame_rgb
-            frame_rgb = canvas
-        
-        img = Image.fromarray(frame_rgb)
-        img_tk = ImageTk.PhotoImage(image=img)
-        
-        self.video_label.configure(image=None)
-        self.video_label.configure(image=img_tk)
-        self.video_label.image = img_tk
+        start = time.perf_counter()
+        self.photo = show_image(self.video_label, self.photo, frame_rgb)
+            
+        if self.debug_overlay:
+            display_ms = (time.perf_counter() - start) * 1000
+            height, width = frame_rgb.shape[:2]
+            levels = " ".join(f"1/{VIEW_LEVELS[view.level]}" for view in self.views)
+            self.debug_var.set(f"準備 {self.prepare_ms:.1f} ms | 顯示 {display_ms:.1f} ms | {width}x{height}"
+                               + (f" | 其他視角 {levels}" if levels else ""))
         
     def update_time_display(self):
-        if self.cap is None:
+        if self.decoder is None:
             return
             
         # 計算當前時間和總時間
@@ -338,102 +884,176 @@ class RallyCutterApp:
         self.frame_label.configure(text=f"Frame: {self.current_frame} / {self.total_frames}")
         
     def frame_to_time(self, frame_num):
-        if self.fps <= 0:
-            return "00:00:00"
-            
-        total_seconds = frame_num / self.fps
-        hours = int(total_seconds // 3600)
-        minutes = int((total_seconds % 3600) // 60)
-        seconds = int(total_seconds % 60)
-        milliseconds = int((total_seconds * 1000) % 1000)
-        
-        return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+        return frame_to_time(frame_num, self.fps)
         
     def start_marker(self):
-        if self.cap is None:
+        if self.decoder is None:
             return
             
-        if self.current_rally is not None:
+        if self.markers.current is not None:
             self.update_status("已有未完成的回合標記，請先結束當前回合")
             return
 
+        snapped = self.snap_to_onset()
         current_time = self.frame_to_time(self.current_frame)
-        self.current_rally = {
-            'start_frame': self.current_frame,
-            'start_time': current_time,
-            'end_frame': None,
-            'end_time': None
-        }
+        self.markers.start(self.current_frame)
         # self.mark_btn.configure(text="標記回合結束 (D)")
-        self.update_status(f"已標記回合 #{len(self.rally_markers) + 1} 開始於 {current_time} (幀 {self.current_frame})")
+        self.draw_filmstrip_markers()
+        self.update_status(f"已標記回合 #{len(self.markers) + 1} 開始於 {current_time} (幀 {self.current_frame})"
+                           + (" (已吸附到聲音起始點)" if snapped else ""))
 
     def end_marker(self):
-        if self.cap is None:
+        if self.decoder is None:
             return
             
-        if self.current_rally is None:
+        if self.markers.current is None:
             self.update_status("請先標記回合開始")
             return
 
+        # 吸附後的位置若不在開始之後，維持原位置
+        start_frame = self.markers.current['start_frame']
+        frame_before_snap = self.current_frame
+        snapped = self.snap_to_onset()
+        if snapped and self.current_frame <= start_frame:
+            self.seek_frame(frame_before_snap)
+            snapped = False
+            
         current_time = self.frame_to_time(self.current_frame)
-        if self.current_frame <= self.current_rally['start_frame']:
+        if self.current_frame <= start_frame:
             self.update_status("錯誤: 結束幀必須在開始幀之後")
             return
 
-        self.current_rally['end_frame'] = self.current_frame
-        self.current_rally['end_time'] = current_time
-
-        # 添加到標記列表
-        self.rally_markers.append(self.current_rally)
-
-        # 計算持續時間
-        start_seconds = self.current_rally['start_frame'] / self.fps
-        end_seconds = self.current_frame / self.fps
-        duration = self.format_duration(end_seconds - start_seconds)
-
-        # 添加到表格
-        self.marker_tree.insert(
-            '', 'end',
-            values=(
-                len(self.rally_markers),
-                self.current_rally['start_time'],
-                self.current_rally['end_time'],
-                duration,
-                self.current_rally['start_frame'],
-                self.current_frame
-            )
-        )
+        # 添加到標記列表與表格
+        self.markers.end(self.current_frame)
+        self.refresh_marker_tree()
 
-        self.current_rally = None
         # self.mark_btn.configure(text="標記回合開始 (S)")
-        self.update_status(f"已標記回合 #{len(self.rally_markers)} 結束於 {current_time} (幀 {self.current_frame})") 
+        self.draw_filmstrip_markers()
+        self.update_status(f"已標記回合 #{len(self.markers)} 結束於 {current_time} (幀 {self.current_frame})"
+                           + (" (已吸附到聲音起始點)" if snapped else ""))
         
              
-    def format_duration(self, seconds):
-        minutes = int(seconds // 60)
-        secs = int(seconds % 60)
-        ms = int((seconds * 1000) % 1000)
-        return f"{minutes:02d}:{secs:02d}.{ms:03d}"
+    def refresh_marker_tree(self):
+        # 表格的每一列依序對應 self.markers 中的回合，iid 為其索引
+        for i in self.marker_tree.get_children():
+            self.marker_tree.delete(i)
+            
+        for i, marker in enumerate(self.markers.markers):
+            proposed = marker.get('proposed', False)
+            self.marker_tree.insert(
+                '', 'end',
+                iid=str(i),
+                values=(
+                    f"{i + 1}?" if proposed else i + 1,
+                    marker['start_time'],
+                    marker['end_time'],
+                    self.markers.duration(marker),
+                    marker['start_frame'],
+                    marker['end_frame']
+                ),
+                tags=('proposed',) if proposed else ()
+            )
+            
+    def on_marker_double_click(self, event):
+        item = self.marker_tree.identify_row(event.y)
+        if item and self.decoder is not None:
+            self.seek_frame(self.markers.markers[int(item)]['start_frame'])
+            
+    def propose_rallies(self):
+        if self.decoder is None:
+            return
+        import multiprocessing
+        from rally_proposal import analyse_video, analysis_step, load_motion_energy
+        if self.motion_worker is not None:
+            self.update_status("畫面動態分析進行中，請稍候")
+            return
+            
+        # 有快取時立即建議
+        step = analysis_step(self.fps)
+        energy = load_motion_energy(self.video_path, step)
+        if energy is not None:
+            self.apply_proposals(energy, step)
+            return
+            
+        # 在子程序中分析，不影響介面與解碼
+        context = multiprocessing.get_context('spawn')
+        self.motion_queue = context.Queue()
+        self.motion_worker = context.Process(target=analyse_video, args=(self.video_path, step, self.motion_queue),
+                                             daemon=True)
+        self.motion_worker.start()
+        self.update_status("正在分析畫面動態以建議回合...")
+        self.root.after(500, self.check_motion_analysis, self.motion_worker, step)
+        
+    def check_motion_analysis(self, worker, step):
+        if worker is not self.motion_worker:
+            return  # 已取消或改為加載其他影片
+            
+        # 子程序結束後，結果可能還在傳送中，稍等一下
+        alive = worker.is_alive()
+        try:
+            video_path, result = self.motion_queue.get_nowait() if alive else self.motion_queue.get(timeout=1)
+        except queue.Empty:
+            if alive:
+                self.root.after(500, self.check_motion_analysis, worker, step)
+            else:
+                self.motion_worker = None
+                self.update_status(f"畫面動態分析失敗 (結束代碼 {worker.exitcode})")
+            return
+            
+        worker.join()
+        self.motion_worker = None
+        if isinstance(result, Exception):
+            self.update_status(f"畫面動態分析失敗: {result}")
+            return
+        self.apply_proposals(result, step)
+        
+    def cancel_motion_analysis(self):
+        if self.motion_worker is not None:
+            self.motion_worker.terminate()
+            self.motion_worker = None
+            
+    def apply_proposals(self, energy, step):
+        from rally_proposal import propose_rallies
+        candidates = propose_rallies(energy, step, self.fps, self.total_frames)
+        
+        # 與現有回合重疊的建議略過
+        added = self.markers.add_proposals(candidates)
+        self.refresh_marker_tree()
+        self.draw_filmstrip_markers()
+        self.update_status(f"偵測到 {len(candidates)} 個可能的回合，新增 {added} 個建議 (橘色)，請檢查後接受或拒絕")
+        
+    def selected_markers(self):
+        return [int(item) for item in self.marker_tree.selection()]
+        
+    def accept_proposals(self):
+        accepted = self.markers.accept(self.selected_markers())
+        self.refresh_marker_tree()
+        self.draw_filmstrip_markers()
+        self.update_status(f"已接受 {accepted} 個回合")
+        
+    def reject_proposals(self):
+        # 只刪除尚未確認的建議，手動標記的回合不受影響
+        rejected = self.markers.reject(self.selected_markers())
+        self.refresh_marker_tree()
+        self.draw_filmstrip_markers()
+        self.update_status(f"已拒絕 {rejected} 個建議回合")
         
     def delete_last_marker(self):
-        if self.current_rally is not None:
+        if self.markers.cancel():
             # 取消當前未完成的標記
-            self.current_rally = None
             self.mark_btn.configure(text="標記回合開始 (S)")
             self.update_status("已取消當前回合標記")
-        elif self.rally_markers:
-            # 刪除最後一個完整標記
-            self.rally_markers.pop()
-            
+        elif self.markers.delete_last() is not None:
             # 從表格中刪除
-            items = self.marker_tree.get_children()
-            if items:
-                self.marker_tree.delete(items[-1])
+            self.refresh_marker_tree()
                 
-            self.update_status(f"已刪除最後一個回合標記，剩餘 {len(self.rally_markers)} 個標記")
+            self.update_status(f"已刪除最後一個回合標記，剩餘 {len(self.markers)} 個標記")
+            
+        self.draw_filmstrip_markers()
             
     def export_csv(self):
-        if not self.rally_markers:
+        # 尚未確認的建議回合不導出
+        if not self.markers.confirmed():
             self.update_status("沒有回合標記可以導出")
             return
             
@@ -447,44 +1067,43 @@ class RallyCutterApp:
             return
             
         try:
-            with open(file_path, 'w', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                
-                # 寫入標題行
-                writer.writerow([
-                    'Rally Number', 
-                    'Start Time', 
-                    'End Time', 
-                    'Duration', 
-                    'Start Frame',
-                    'End Frame',
-                    'Start Seconds',
-                    'End Seconds'
-                ])
-                
-                # 寫入數據行
-                for i, marker in enumerate(self.rally_markers):
-                    start_seconds = marker['start_frame'] / self.fps
-                    end_seconds = marker['end_frame'] / self.fps
-                    duration = end_seconds - start_seconds
-                    
-                    writer.writerow([
-                        i + 1,
-                        marker['start_time'],
-                        marker['end_time'],
-                        self.format_duration(duration),
-                        marker['start_frame'],
-                        marker['end_frame'],
-                        f"{start_seconds:.3f}",
-                        f"{end_seconds:.3f}"
-                    ])
-                    
-            self.update_status(f"已成功導出CSV文件到 {file_path}")
+            written, skipped = self.markers.export_csv(file_path)
+            if skipped:
+                self.update_status(f"已成功導出CSV文件到 {file_path}，略過 {skipped} 個尚未接受的建議回合")
+            else:
+                self.update_status(f"已成功導出CSV文件到 {file_path}")
         except Exception as e:
             self.update_status(f"導出CSV時出錯: {str(e)}")
             
+    def import_csv(self):
+        if self.decoder is None:
+            return
+            
+        file_path = filedialog.askopenfilename(
+            title="選擇 rally_labels.csv",
+            initialdir=os.path.dirname(self.video_path),
+            filetypes=(("CSV files", "*.csv"), ("All files", "*.*"))
+        )
+        
+        if not file_path:
+            return
+            
+        try:
+            count = self.markers.import_csv(file_path)
+        except (OSError, RallyLabelError) as e:
+            self.update_status(f"導入CSV時出錯: {str(e)}")
+            return
+            
+        self.refresh_marker_tree()
+        self.draw_filmstrip_markers()
+        problems = self.markers.problems(self.total_frames)
+        if problems:
+            self.update_status(f"已導入 {count} 個回合，但有 {len(problems)} 個問題: {problems[0]}")
+        else:
+            self.update_status(f"已導入 {count} 個回合")
+            
     def key_press_event(self, event):
-        if self.cap is None:
+        if self.decoder is None:
             return
             
         # 控制鍵
@@ -506,20 +1125,56 @@ class RallyCutterApp:
             self.step_frames(10)  # 前進10幀
         elif event.keysym == 'Down':
             self.step_frames(-10)  # 後退10幀
+        elif event.keysym == 'F12':
+            self.toggle_debug_overlay()
             
+    def toggle_debug_overlay(self):
+        self.debug_overlay = not self.debug_overlay
+        if self.debug_overlay:
+            self.debug_label.place(x=5, y=5)
+        else:
+            self.debug_label.place_forget()
+            
+    def update_cache_status(self, decoder):
+        # 每秒更新一次，換影片後停止舊的更新
+        if decoder is not self.decoder:
+            return
+            
+        hit_rate, frames, size = decoder.cache_stats()
+        hit_text = f"{hit_rate:.0%}" if hit_rate is not None else "-"
+        self.cache_var.set(f"快取命中 {hit_text} ({frames} 幀, {size / (1024 * 1024):.0f}/{self.cache_mb} MB)")
+        self.root.after(1000, self.update_cache_status, decoder)
+        
     def update_status(self, message):
         self.status_var.set(message)
         print(message)  # 同時在控制台打印
         
     def close(self):
-        if self.cap is not None:
-            self.cap.release()
+        self.cancel_proxy_build()
+        self.cancel_thumbnail_build()
+        self.cancel_motion_analysis()
+        if self.decoder is not None:
+            self.decoder.close()
+        for view in self.views:
+            view.decoder.close()
             
 
 # 啟動應用程序
 def main():
+    parser = argparse.ArgumentParser(description='Rally labeling tool')
+    parser.add_argument('--cache_mb', type=int, default=DEFAULT_CACHE_MB,
+                        help=f'Memory limit in MB for cached display frames (default {DEFAULT_CACHE_MB})')
+    parser.add_argument('--no_proxy', action='store_true',
+                        help='Always decode the source video instead of a low-resolution proxy')
+    parser.add_argument('--single_view', action='store_true',
+                        help='Only show the opened video, not the other views in its directory')
+    parser.add_argument('--debug', action='store_true',
+                        help='Show per-frame render times over the video (toggle with F12)')
+    args = parser.parse_args()
+    
     root = tk.Tk()
-    app = RallyCutterApp(root)
+    app = RallyCutterApp(root, cache_mb=args.cache_mb, use_proxy=not args.no_proxy, debug=args.debug,
+                         multi_view=not args.single_view)
     
     # 設置關閉窗口時的回調
     root.protocol("WM_DELETE_WINDOW", lambda: (app.close(), root.destroy()))
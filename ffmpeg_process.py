@@ -0,0 +1,71 @@
+"""ffmpeg child processes of the labeling tool's background builds (proxy, thumbnails, analysis).
+
+stderr always goes to an anonymous temporary file rather than a pipe: a pipe that is only read once
+ffmpeg exits fills up after 64 KB of messages (e.g. on a damaged source) and then blocks ffmpeg
+forever. The messages are read back only to report a failure.
+"""
+import tempfile
+import subprocess
+
+
+class FFmpegProcess:
+    """A running ffmpeg command. stdout is a pipe (self.stdout) unless another target is given."""
+
+    def __init__(self, cmd, stdout=subprocess.PIPE):
+        self.stderr = tempfile.TemporaryFile()
+        try:
+            self.process = subprocess.Popen(cmd, stdout=stdout, stderr=self.stderr)
+        except BaseException:
+            self.stderr.close()
+            raise
+        self.stdout = self.process.stdout
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def returncode(self):
+        return self.process.returncode
+
+    def poll(self):
+        return self.process.poll()
+
+    def error(self):
+        """What ffmpeg has written to stderr so far, as text."""
+        self.stderr.seek(0)
+        return self.stderr.read().decode(errors='replace').strip()
+
+    def check(self):
+        """Wait for ffmpeg to exit; raises RuntimeError with its messages on a non-zero exit status."""
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with {self.process.returncode}: {self.error()}")
+
+    def terminate(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+
+    def close(self):
+        """Stop ffmpeg if it still runs and release its pipe and message file."""
+        self.terminate()
+        self.process.wait()
+        if self.stdout is not None:
+            self.stdout.close()
+        self.stderr.close()
+
+
+def stream_ffmpeg(cmd, chunk_bytes):
+    """Run ffmpeg and yield its stdout in chunks of chunk_bytes (only the last one may be shorter).
+
+    Raises RuntimeError with ffmpeg's messages once stdout ends if ffmpeg failed. Closing the
+    generator early stops ffmpeg.
+    """
+    with FFmpegProcess(cmd) as process:
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            yield data
+        process.check()
@@ -0,0 +1,124 @@
+"""Thumbnail filmstrip of a video, used by cut_rallies.py to navigate long matches.
+
+One thumbnail is taken every THUMB_INTERVAL seconds, at exact frame numbers (multiples of the
+step), in a single sequential ffmpeg pass that only scales the selected frames. Thumbnails are
+stored as one uint8 array (count, height, width, 3) in <video>.thumbs.npy and memory-mapped, so
+reopening a video shows its filmstrip instantly without reading the whole file.
+"""
+import os
+import math
+import logging
+import threading
+
+import numpy as np
+
+from ffmpeg_process import FFmpegProcess
+
+
+logger = logging.getLogger(__name__)
+
+THUMB_SUFFIX = '.thumbs.npy'
+THUMB_INTERVAL = 5  # Seconds between thumbnails
+THUMB_HEIGHT = 54
+
+
+def thumb_path(video_path):
+    return video_path + THUMB_SUFFIX
+
+
+def thumb_layout(total_frames, fps, width, height, interval=THUMB_INTERVAL, thumb_height=THUMB_HEIGHT):
+    """(frames between thumbnails, thumbnail count, thumbnail width, thumbnail height) of a video."""
+    step = max(1, round(interval * (fps or 30)))
+    count = max(1, math.ceil(total_frames / step))
+    # ffmpeg's scaler wants even dimensions
+    thumb_width = max(2, round(thumb_height * width / height / 2) * 2) if height else thumb_height
+    return step, count, thumb_width, thumb_height
+
+
+def load_thumbnails(video_path, shape):
+    """Memory-map the cached thumbnails of video_path, or return None if missing, stale or of another layout."""
+    path = thumb_path(video_path)
+    try:
+        if os.path.getmtime(path) < os.path.getmtime(video_path):
+            return None
+        thumbs = np.load(path, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    if thumbs.shape != shape or thumbs.dtype != np.uint8:
+        return None
+    return thumbs
+
+
+class ThumbnailBuild:
+    """Decodes the thumbnails of a video on a background thread, straight into a memory-mapped cache file.
+
+    thumbs can be displayed while the build runs; done counts the thumbnails written so far (the
+    rest are black). The file is renamed into place only when complete.
+    """
+
+    def __init__(self, video_path, step, shape):
+        self.video_path = video_path
+        self.step = step
+        self.path = thumb_path(video_path)
+        self.tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        self.thumbs = np.lib.format.open_memmap(self.tmp_path, mode='w+', dtype=np.uint8, shape=shape)
+        self.done = 0
+        self.finished = False
+        self.error = None
+        self.process = None
+        self.cancelled = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def command(self):
+        count, height, width, _ = self.thumbs.shape
+        return [
+            'ffmpeg',
+            '-loglevel', 'error',
+            '-i', self.video_path,
+            '-map', '0:v:0',
+            '-an', '-sn',
+            # Every frame is decoded once, in order, but only every step-th frame is scaled and written
+            '-vf', f"select='not(mod(n\\,{self.step}))',scale={width}:{height}",
+            '-vsync', 'passthrough',
+            '-frames:v', str(count),
+            '-f', 'rawvideo',
+            '-pix_fmt', 'rgb24',
+            'pipe:'
+        ]
+
+    def run(self):
+        try:
+            self.process = FFmpegProcess(self.command())
+            if self.cancelled:
+                self.process.terminate()
+            for i in range(len(self.thumbs)):
+                view = memoryview(self.thumbs[i]).cast('B')
+                filled = 0
+                while filled < len(view):
+                    n = self.process.stdout.readinto(view[filled:])
+                    if not n:
+                        break
+                    filled += n
+                if filled < len(view):
+                    break  # Fewer frames than the container claims; the rest stay black
+                self.done = i + 1
+            if self.cancelled:
+                raise RuntimeError("cancelled")
+            self.process.check()
+            self.thumbs.flush()
+            os.replace(self.tmp_path, self.path)
+            logger.info(f"Thumbnails ready: {self.path} ({self.done} of {len(self.thumbs)})")
+        except Exception as e:
+            self.error = e
+            if os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
+        finally:
+            if self.process is not None:
+                self.process.close()
+            self.finished = True
+
+    def cancel(self):
+        self.cancelled = True
+        if self.process is not None:
+            self.process.terminate()
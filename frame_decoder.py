@@ -0,0 +1,270 @@
+"""Background decoding for cut_rallies.py.
+
+FrameDecoder owns the cv2.VideoCapture. A decoder thread seeks, decodes and prepares frames
+(colour conversion and resizing to display size) into a bounded buffer ahead of the playhead,
+so the Tk main thread only has to blit ready images. Prepared frames are also kept in an LRU
+cache, so stepping back and forth around a position does not decode again.
+"""
+import threading
+import collections
+
+import cv2
+
+
+# Display-ready frames decoded ahead of the playhead
+PREFETCH_FRAMES = 32
+
+# Without a keyframe index, decode at most this many frames forward instead of seeking
+MAX_FORWARD_DECODE = 30
+
+# Memory for cached display-ready frames (about 350 frames at 800x600)
+CACHE_MB = 512
+
+# On a seek, frames up to this many seconds before the target are prepared and cached on the way
+CACHE_FILL_SECONDS = 2
+
+
+class FrameCache:
+    """LRU cache of display-ready frames keyed by frame number, bounded by their size in bytes.
+
+    Not thread-safe on its own: FrameDecoder only uses it while holding its lock.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.frames = collections.OrderedDict()  # frame_num -> image, least recently used first
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __contains__(self, frame_num):
+        return frame_num in self.frames
+
+    def get(self, frame_num):
+        image = self.frames.get(frame_num)
+        if image is not None:
+            self.frames.move_to_end(frame_num)
+        return image
+
+    def put(self, frame_num, image):
+        if image.nbytes > self.max_bytes:
+            return
+        old = self.frames.pop(frame_num, None)
+        if old is not None:
+            self.size -= old.nbytes
+        self.frames[frame_num] = image
+        self.size += image.nbytes
+        while self.size > self.max_bytes:
+            _, old = self.frames.popitem(last=False)
+            self.size -= old.nbytes
+
+    def clear(self):
+        self.frames.clear()
+        self.size = 0
+
+    def record(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def hit_rate(self):
+        """Fraction of seeks served without decoding, or None before the first seek."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else None
+
+
+class FrameDecoder:
+    """Decodes a video on a background thread into a buffer of (frame number, display-ready image).
+
+    The UI thread only calls seek(), take() and at_end(); the capture itself is only ever used by
+    the decoder thread. prepare(frame) turns a decoded BGR frame into what the UI displays and runs
+    on the decoder thread, so it must not touch Tk.
+    """
+
+    def __init__(self, video_path, prepare, buffer_size=PREFETCH_FRAMES, cache_mb=CACHE_MB):
+        self.cap = cv2.VideoCapture(video_path)
+        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.prepare = prepare
+        self.buffer_size = buffer_size
+        self.fill_frames = int(CACHE_FILL_SECONDS * (self.fps or 30))
+        self.frame_index = None  # FrameIndex, set once it has been built
+
+        self.cond = threading.Condition()
+        self.buffer = collections.deque()  # (frame_num, image) in order, starting at the playhead
+        self.cache = FrameCache(cache_mb * 1024 * 1024)
+        self.generation = 0     # Incremented by every seek that invalidates the decoder's work
+        self.cache_epoch = 0    # Incremented when cached frames no longer match the display size
+        self.next_frame = None  # Frame the decoder thread produces next; None until the first seek
+        self.seek_target = None # Frame requested by a seek that missed the cache
+        self.playhead = 0       # Frames before this are late and skipped
+        self.decoder_pos = None # Frame the next cap.read() returns; None when unknown
+        self.end_of_stream = False
+        self.closed = False
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        if self.cap.isOpened():
+            self.thread.start()
+
+    def is_opened(self):
+        return self.cap.isOpened()
+
+    def seek(self, frame_num, flush=False):
+        """Make frame_num the next frame, from the prefetch buffer or the cache when possible.
+
+        flush drops every prepared frame (the display size changed).
+        """
+        with self.cond:
+            self.playhead = frame_num
+            self.end_of_stream = False
+            if flush:
+                self.buffer.clear()
+                self.cache.clear()
+                self.cache_epoch += 1
+            if self.buffer and self.buffer[0][0] <= frame_num <= self.buffer[-1][0]:
+                # Stepping forward within the prefetched frames
+                while self.buffer[0][0] < frame_num:
+                    self.buffer.popleft()
+            if self.buffer and self.buffer[0][0] == frame_num:
+                self.cache.record(hit=True)
+            else:
+                self.buffer.clear()
+                self.generation += 1
+                image = self.cache.get(frame_num)
+                self.cache.record(hit=image is not None)
+                if image is not None:
+                    self.buffer.append((frame_num, image))
+                    self.next_frame = frame_num + 1
+                    self.seek_target = None
+                else:
+                    self.next_frame = frame_num
+                    self.seek_target = frame_num
+            self.cond.notify_all()
+
+    def take(self, frame_num):
+        """Remove buffered frames up to frame_num and return the latest of them as (frame_num, image).
+
+        Returns (None, None) if frame_num has not been decoded yet. Frames skipped over are dropped.
+        """
+        found = (None, None)
+        with self.cond:
+            self.playhead = max(self.playhead, frame_num)
+            while self.buffer and self.buffer[0][0] <= frame_num:
+                found = self.buffer.popleft()
+            self.cond.notify_all()
+        return found
+
+    def at_end(self):
+        with self.cond:
+            return self.end_of_stream and not self.buffer
+
+    def cache_stats(self):
+        """(hit rate or None, cached frames, cached bytes) of the frame cache."""
+        with self.cond:
+            return self.cache.hit_rate(), len(self.cache), self.cache.size
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.thread.is_alive():
+            self.thread.join(timeout=1)
+        else:
+            self.cap.release()
+
+    def keyframe_before(self, frame_num):
+        if self.frame_index is None:
+            return None
+        return self.frame_index.keyframe_before(frame_num)
+
+    def cache_frame(self, frame_num, image, epoch):
+        with self.cond:
+            if epoch == self.cache_epoch:
+                self.cache.put(frame_num, image)
+
+    def seek_capture(self, frame_num, fill_from, generation, epoch):
+        """Position the capture so that the next read() returns frame_num, decoding as little as possible.
+
+        Frames decoded on the way from fill_from on are prepared and cached. Returns False if the
+        stream ended, None if a newer seek made this one pointless.
+        """
+        pos = self.decoder_pos
+        keyframe = self.keyframe_before(frame_num)
+
+        # Forward moves that stay close to (or in the GOP of) the current position keep decoding from there
+        if pos is not None and pos <= frame_num and (
+                frame_num - pos <= MAX_FORWARD_DECODE or (keyframe is not None and keyframe <= pos)):
+            start = pos
+        elif keyframe is not None:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+            start = keyframe
+        else:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
+            start = frame_num
+        self.decoder_pos = start
+
+        for n in range(start, frame_num):
+            if self.generation != generation:
+                return None
+            if n >= fill_from and n not in self.cache:
+                ret, frame = self.cap.read()
+                if ret:
+                    self.cache_frame(n, self.prepare(frame), epoch)
+            else:
+                # grab() decodes without converting the frame, cheaper than read()
+                ret = self.cap.grab()
+            if not ret:
+                self.decoder_pos = None
+                return False
+            self.decoder_pos = n + 1
+        return True
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.closed and (
+                        self.next_frame is None or self.end_of_stream or len(self.buffer) >= self.buffer_size):
+                    self.cond.wait()
+                if self.closed:
+                    break
+                generation = self.generation
+                epoch = self.cache_epoch
+                # Frames behind the playhead would never be shown
+                frame_num = max(self.next_frame, self.playhead)
+                fill = frame_num == self.seek_target
+                image = self.cache.get(frame_num)
+                if image is not None:
+                    self.buffer.append((frame_num, image))
+                    self.next_frame = frame_num + 1
+                    self.cond.notify_all()
+                    continue
+
+            fill_from = frame_num - self.fill_frames if fill else frame_num
+            ok = self.seek_capture(frame_num, fill_from, generation, epoch)
+            if ok is None:
+                continue
+            ret, frame = self.cap.read() if ok else (False, None)
+            self.decoder_pos = frame_num + 1 if ret else None
+            image = self.prepare(frame) if ret else None
+
+            with self.cond:
+                if image is not None and epoch == self.cache_epoch:
+                    self.cache.put(frame_num, image)
+                if generation != self.generation:
+                    continue  # A seek arrived while decoding, the frame is no longer wanted
+                if not ret:
+                    self.end_of_stream = True
+                else:
+                    self.buffer.append((frame_num, image))
+                    self.next_frame = frame_num + 1
+                    if fill:
+                        self.seek_target = None
+                self.cond.notify_all()
+
+        self.cap.release()
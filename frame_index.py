@@ -0,0 +1,87 @@
+"""Keyframe / PTS index of a video, used by cut_rallies.py for fast frame-accurate seeking.
+
+The index is built once with ffprobe (packets only, nothing is decoded) and cached next to the
+video as <video>.frameindex.npz, keyed on the video's size and mtime.
+"""
+import bisect
+import subprocess
+
+import numpy as np
+
+from npz_cache import load_cached_npz, save_cached_npz, source_key
+
+
+INDEX_SUFFIX = '.frameindex.npz'
+INDEX_VERSION = 1
+
+
+class FrameIndex:
+    """Presentation timestamps of every frame and the frame numbers of the keyframes."""
+
+    def __init__(self, pts, keyframes):
+        self.pts = pts              # float64 seconds, in presentation (= OpenCV frame number) order
+        self.keyframes = keyframes  # sorted frame numbers of the keyframes
+        self._keyframe_list = keyframes.tolist()
+
+    @property
+    def frame_count(self):
+        return len(self.pts)
+
+    def keyframe_before(self, frame_num):
+        """Frame number of the last keyframe at or before frame_num (decoding must start there)."""
+        i = bisect.bisect_right(self._keyframe_list, frame_num) - 1
+        return self._keyframe_list[i] if i >= 0 else 0
+
+
+def index_path(video_path):
+    return video_path + INDEX_SUFFIX
+
+
+def build_frame_index(video_path):
+    """Read the PTS and keyframe flag of every video packet with ffprobe."""
+    cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        video_path
+    ]
+    result = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    packets = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        try:
+            packets.append((float(pts_time), 'K' in flags))
+        except ValueError:
+            continue  # Packets without a PTS (N/A) cannot be addressed by frame number
+    # Packets come in decode order; frame numbers count frames in presentation order
+    packets.sort()
+
+    pts = np.array([p for p, _ in packets], dtype=np.float64)
+    keyframes = np.array([i for i, (_, key) in enumerate(packets) if key], dtype=np.int64)
+    if len(keyframes) == 0 or keyframes[0] != 0:
+        keyframes = np.concatenate([[0], keyframes]).astype(np.int64)
+    return FrameIndex(pts, keyframes)
+
+
+def load_frame_index(video_path):
+    """Return the cached index of video_path, or None if there is none or it is out of date."""
+    data = load_cached_npz(index_path(video_path), source_key(video_path, INDEX_VERSION))
+    return FrameIndex(data['pts'], data['keyframes']) if data is not None else None
+
+
+def save_frame_index(video_path, index):
+    """Cache the index next to the video."""
+    save_cached_npz(index_path(video_path), source_key(video_path, INDEX_VERSION), pts=index.pts,
+                    keyframes=index.keyframes)
+
+
+def get_frame_index(video_path):
+    """Load the cached index of video_path, building and caching it if needed."""
+    index = load_frame_index(video_path)
+    if index is None:
+        index = build_frame_index(video_path)
+        save_frame_index(video_path, index)
+    return index
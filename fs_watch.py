@@ -0,0 +1,145 @@
+import os
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+# inotify event masks (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+# Sentinel returned instead of a set of directories when everything must be rescanned
+RESCAN_ALL = None
+
+
+def is_relevant(name):
+    """Only label files and videos (and new directories) matter to the cutter."""
+    return name == 'rally_labels.csv' or name.endswith('.mp4')
+
+
+class InotifyWatcher:
+    """Recursive inotify watch on a directory tree, using libc through ctypes (no extra packages).
+
+    inotify only sees changes made through the local kernel: writes done by other NFS clients are
+    invisible, so use PollingWatcher for trees that are written to from other hosts.
+    """
+
+    def __init__(self, base_dir):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 failed: {os.strerror(err)}")
+        self.watches = {}  # wd -> directory
+        self.add_tree(base_dir)
+
+    def add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise OSError(err, "inotify watch limit reached (fs.inotify.max_user_watches)")
+            logger.warning(f"Cannot watch {path}: {os.strerror(err)}")
+            return
+        self.watches[wd] = path
+
+    def add_tree(self, path):
+        for root, dirs, files in os.walk(path):
+            self.add_watch(root)
+
+    def wait(self, timeout):
+        """Block up to timeout seconds; return the set of directories with relevant changes, or RESCAN_ALL."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0')
+                name = os.fsdecode(name)
+                offset += EVENT_HEADER.size + length
+
+                if mask & IN_Q_OVERFLOW:
+                    logger.warning("inotify event queue overflowed, rescanning everything")
+                    return RESCAN_ALL
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+                directory = self.watches.get(wd)
+                if directory is None:
+                    continue
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        # A new match directory, possibly moved in with its files already there
+                        new_dir = os.path.join(directory, name)
+                        self.add_tree(new_dir)
+                        for root, dirs, files in os.walk(new_dir):
+                            changed.add(root)
+                elif is_relevant(name):
+                    changed.add(directory)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback watcher: asks for a rescan every poll_interval seconds.
+
+    Rescans go through the mtime-keyed discovery index, so unchanged directories are only stat()ed.
+    """
+
+    def __init__(self, base_dir, poll_interval=30):
+        self.poll_interval = poll_interval
+        self.last_poll = time.monotonic()
+
+    def wait(self, timeout):
+        remaining = self.last_poll + self.poll_interval - time.monotonic()
+        if remaining > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(remaining, 0))
+        self.last_poll = time.monotonic()
+        return RESCAN_ALL
+
+    def close(self):
+        pass
+
+
+def create_watcher(base_dir, poll_interval=30, force_polling=False):
+    """Return an InotifyWatcher for base_dir, or a PollingWatcher where inotify is unavailable."""
+    if not force_polling:
+        try:
+            watcher = InotifyWatcher(base_dir)
+            logger.info(f"Watching {base_dir} with inotify ({len(watcher.watches)} directories)")
+            return watcher
+        except (OSError, AttributeError) as e:
+            logger.warning(f"inotify unavailable ({e}), falling back to polling every {poll_interval}s")
+    else:
+        logger.info(f"Polling {base_dir} every {poll_interval}s")
+    return PollingWatcher(base_dir, poll_interval)
@@ -0,0 +1,259 @@
+"""Headless rally labeling model, shared by cut_rallies.py and batch scripts.
+
+RallyMarkers holds the rally marks of one video by frame number and converts them to and from
+rally_labels.csv through rally_labels.py. VideoInfo probes a video's frame rate and frame count
+with ffprobe, only when first asked. Only the standard library is imported, so label files can be
+validated and converted without OpenCV, NumPy, PIL or a display:
+
+    python labeling_core.py MathcesDir/m1/rally_labels.csv --video MathcesDir/m1/1.mp4
+"""
+import sys
+import json
+import bisect
+import argparse
+import subprocess
+from functools import cached_property
+
+from rally_labels import (RallyLabelError, format_duration, frame_to_time, make_rally_label,
+                          read_rally_labels, write_rally_labels)
+
+
+class MarkerError(ValueError):
+    """Raised when a mark does not fit the current marker state (e.g. an end before its start)."""
+
+
+class VideoInfo:
+    """Frame rate, frame count and size of a video, probed with ffprobe on first access."""
+
+    def __init__(self, video_path):
+        self.video_path = video_path
+
+    @cached_property
+    def stream(self):
+        cmd = [
+            'ffprobe',
+            '-v', 'error',
+            '-select_streams', 'v:0',
+            '-count_packets',  # Exact frame count even where the container has no nb_frames
+            '-show_entries', 'stream=avg_frame_rate,r_frame_rate,nb_frames,nb_read_packets,width,height',
+            '-of', 'json',
+            self.video_path
+        ]
+        result = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        streams = json.loads(result.stdout).get('streams') or []
+        if not streams:
+            raise ValueError(f"{self.video_path}: no video stream")
+        return streams[0]
+
+    @property
+    def fps(self):
+        for key in ('avg_frame_rate', 'r_frame_rate'):
+            num, _, den = self.stream.get(key, '0/0').partition('/')
+            if float(den or 1) > 0 and float(num) > 0:
+                return float(num) / float(den or 1)
+        return 0.0
+
+    @property
+    def total_frames(self):
+        for key in ('nb_frames', 'nb_read_packets'):
+            value = self.stream.get(key)
+            if value and str(value).isdigit():
+                return int(value)
+        return 0
+
+    @property
+    def width(self):
+        return int(self.stream.get('width', 0))
+
+    @property
+    def height(self):
+        return int(self.stream.get('height', 0))
+
+
+class RallyMarkers:
+    """Rally marks of one video.
+
+    markers is a list of dicts with start_frame, end_frame, start_time and end_time, plus
+    'proposed': True for automatic proposals not accepted yet, kept in start frame order. current is
+    the rally whose start has been marked but not its end. ended lists the markers ended by hand, in
+    the order they were ended.
+    """
+
+    def __init__(self, fps):
+        self.fps = fps
+        self.markers = []
+        self.current = None
+        self.ended = []
+
+    def __len__(self):
+        return len(self.markers)
+
+    def frame_to_time(self, frame_num):
+        return frame_to_time(frame_num, self.fps)
+
+    def duration(self, marker):
+        """Duration of a marker as MM:SS.mmm."""
+        return format_duration((marker['end_frame'] - marker['start_frame']) / self.fps)
+
+    def make_marker(self, start_frame, end_frame, proposed=False):
+        marker = {
+            'start_frame': start_frame,
+            'end_frame': end_frame,
+            'start_time': self.frame_to_time(start_frame),
+            'end_time': self.frame_to_time(end_frame) if end_frame is not None else None
+        }
+        if proposed:
+            marker['proposed'] = True
+        return marker
+
+    def start(self, frame_num):
+        if self.current is not None:
+            raise MarkerError(f"rally started at frame {self.current['start_frame']} has not ended")
+        self.current = self.make_marker(frame_num, None)
+        return self.current
+
+    def end(self, frame_num):
+        if self.current is None:
+            raise MarkerError("no rally has been started")
+        if frame_num <= self.current['start_frame']:
+            raise MarkerError(f"end frame {frame_num} is not after start frame {self.current['start_frame']}")
+        marker = self.make_marker(self.current['start_frame'], frame_num)
+        # Keep markers in time order, so list positions match the exported rally numbers
+        i = bisect.bisect_right([m['start_frame'] for m in self.markers], marker['start_frame'])
+        self.markers.insert(i, marker)
+        self.ended.append(marker)
+        self.current = None
+        return marker
+
+    def cancel(self):
+        """Drop the open rally; returns whether there was one."""
+        had_open = self.current is not None
+        self.current = None
+        return had_open
+
+    def delete_last(self):
+        """Remove and return the marker ended most recently by hand, or None if there is none.
+
+        markers is kept in time order, so its last entry is not necessarily the last one marked. Without
+        a marker ended by hand (e.g. right after an import) the last confirmed marker in time is
+        removed; pending proposals are never removed this way, only rejected.
+        """
+        while self.ended:
+            marker = self.ended.pop()
+            for i, m in enumerate(self.markers):
+                if m is marker:
+                    return self.markers.pop(i)
+        confirmed = self.confirmed()
+        if not confirmed:
+            return None
+        self.markers = [m for m in self.markers if m is not confirmed[-1]]
+        return confirmed[-1]
+
+    def add_proposals(self, candidates):
+        """Add [(start_frame, end_frame)] as proposed markers, skipping those overlapping a marker; returns how many."""
+        existing = [(m['start_frame'], m['end_frame']) for m in self.markers]
+        added = 0
+        for start_frame, end_frame in candidates:
+            if any(start_frame <= end and start <= end_frame for start, end in existing):
+                continue
+            self.markers.append(self.make_marker(start_frame, end_frame, proposed=True))
+            added += 1
+        self.markers.sort(key=lambda m: m['start_frame'])
+        return added
+
+    def accept(self, indices):
+        for i in indices:
+            self.markers[i].pop('proposed', None)
+        return len(indices)
+
+    def reject(self, indices):
+        """Remove the proposals among indices (confirmed markers are kept); returns how many."""
+        rejected = [i for i in indices if self.markers[i].get('proposed')]
+        for i in sorted(rejected, reverse=True):
+            del self.markers[i]
+        return len(rejected)
+
+    def confirmed(self):
+        """Markers that are not pending proposals, in time order."""
+        return sorted((m for m in self.markers if not m.get('proposed')), key=lambda m: m['start_frame'])
+
+    def to_labels(self):
+        return [make_rally_label(i + 1, m['start_frame'], m['end_frame'], self.fps)
+                for i, m in enumerate(self.confirmed())]
+
+    def export_csv(self, csv_file):
+        """Write the confirmed markers to rally_labels.csv; returns (written, skipped proposals)."""
+        labels = self.to_labels()
+        write_rally_labels(csv_file, labels)
+        return len(labels), len(self.markers) - len(labels)
+
+    def import_csv(self, csv_file):
+        """Replace the markers with those of a rally_labels.csv file (raises RallyLabelError)."""
+        labels = read_rally_labels(csv_file)
+        self.markers = sorted((self.make_marker(label.start_frame, label.end_frame) for label in labels),
+                              key=lambda m: m['start_frame'])
+        self.current = None
+        self.ended = []
+        return len(self.markers)
+
+    def problems(self, total_frames=None):
+        """Overlapping rallies and rallies past the end of the video, as messages."""
+        problems = []
+        markers = sorted(self.markers, key=lambda m: m['start_frame'])
+        for previous, marker in zip(markers, markers[1:]):
+            if marker['start_frame'] < previous['end_frame']:
+                problems.append(f"rally at frames {marker['start_frame']}-{marker['end_frame']} overlaps "
+                                f"{previous['start_frame']}-{previous['end_frame']}")
+        if total_frames:
+            for marker in markers:
+                if marker['end_frame'] >= total_frames:
+                    problems.append(f"rally at frames {marker['start_frame']}-{marker['end_frame']} ends after "
+                                    f"the last frame ({total_frames - 1})")
+        return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate rally_labels.csv files and rewrite them in the exported format')
+    parser.add_argument('csv_files', nargs='+', help='rally_labels.csv files to check')
+    parser.add_argument('--video', help='Video the labels belong to (frame rate and frame count are probed from it)')
+    parser.add_argument('--fps', type=float, help='Frame rate, instead of probing --video')
+    parser.add_argument('--output', help='Rewrite the labels here, renumbered in time order with times recomputed '
+                                         'from the frame numbers (only with a single input file)')
+    args = parser.parse_args()
+
+    if args.output and len(args.csv_files) != 1:
+        parser.error("--output needs exactly one input file")
+
+    video = VideoInfo(args.video) if args.video else None
+    try:
+        fps = args.fps or (video.fps if video else 0)
+        total_frames = video.total_frames if video else None
+    except (OSError, ValueError, subprocess.CalledProcessError) as e:
+        print(f"Cannot probe {args.video}: {e}", file=sys.stderr)
+        return 2
+    if args.output and not fps:
+        parser.error("--output needs --fps or --video")
+
+    failed = False
+    for csv_file in args.csv_files:
+        markers = RallyMarkers(fps)
+        try:
+            count = markers.import_csv(csv_file)
+        except (OSError, RallyLabelError) as e:
+            print(f"{csv_file}: {e}", file=sys.stderr)
+            failed = True
+            continue
+        problems = markers.problems(total_frames)
+        for problem in problems:
+            print(f"{csv_file}: {problem}", file=sys.stderr)
+        failed = failed or bool(problems)
+        print(f"{csv_file}: {count} rallies" + (f", {len(problems)} problems" if problems else ", OK"))
+
+        if args.output:
+            written, _ = markers.export_csv(args.output)
+            print(f"Wrote {written} rallies to {args.output}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
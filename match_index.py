@@ -0,0 +1,139 @@
+import os
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 2
+LABELS_FILE = 'rally_labels.csv'
+
+
+def sort_video_files(video_files):
+    """Sort view files numerically (1.mp4, 2.mp4, ..., 10.mp4), non-numeric names last by name."""
+    return sorted(video_files, key=lambda x: (0, int(os.path.splitext(x)[0]), '') if os.path.splitext(x)[0].isdigit()
+                  else (1, 0, x))
+
+
+def load_index(index_file):
+    """Load a discovery index, returning an empty one if it is missing, unreadable or outdated."""
+    if index_file and os.path.exists(index_file):
+        try:
+            with open(index_file, 'r') as f:
+                index = json.load(f)
+            if index.get('version') == INDEX_VERSION:
+                return index
+            logger.info(f"Discovery index {index_file} has an old format, rebuilding it")
+        except Exception as e:
+            logger.error(f"Error loading discovery index: {e}")
+    return {'version': INDEX_VERSION, 'dirs': {}}
+
+
+def save_index(index, index_file):
+    """Write the discovery index atomically."""
+    tmp_file = f"{index_file}.tmp"
+    try:
+        with open(tmp_file, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_file, index_file)
+    except Exception as e:
+        logger.error(f"Error saving discovery index: {e}")
+
+
+def scan_directory(path, old_dirs, new_dirs, parse_labels, recursive=True):
+    """Index one directory and its subtree, reusing cached listings of directories whose mtime is unchanged.
+
+    A directory's mtime changes whenever an entry is added, removed or renamed in it, so an unchanged
+    mtime means its cached listing is still valid and the (slow, on NFS) scandir can be skipped. Every
+    directory is still stat()ed, since changes deeper in the tree do not propagate upwards. Labels are
+    re-parsed only when rally_labels.csv itself changed size or mtime.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        logger.error(f"Cannot access {path}: {e}")
+        return
+
+    cached = old_dirs.get(path)
+    if cached is not None and cached['mtime_ns'] == stat.st_mtime_ns:
+        entry = dict(cached)
+    else:
+        subdirs = []
+        video_files = []
+        has_labels = False
+        try:
+            with os.scandir(path) as it:
+                for dir_entry in it:
+                    if dir_entry.is_dir(follow_symlinks=False):
+                        subdirs.append(dir_entry.name)
+                    elif dir_entry.name.endswith('.mp4'):
+                        video_files.append(dir_entry.name)
+                    elif dir_entry.name == LABELS_FILE:
+                        has_labels = True
+        except OSError as e:
+            logger.error(f"Cannot list {path}: {e}")
+            return
+        entry = {
+            'mtime_ns': stat.st_mtime_ns,
+            'subdirs': sorted(subdirs),
+            'video_files': sort_video_files(video_files),
+            'has_labels': has_labels,
+        }
+
+    if entry['has_labels'] and entry['video_files']:
+        csv_file = os.path.join(path, LABELS_FILE)
+        try:
+            csv_stat = os.stat(csv_file)
+            labels_key = [csv_stat.st_size, csv_stat.st_mtime_ns]
+            if cached is None or cached.get('labels_key') != labels_key or 'rallies' not in cached:
+                entry['rallies'] = parse_labels(csv_file)
+            else:
+                entry['rallies'] = cached['rallies']
+            entry['labels_key'] = labels_key
+        except Exception as e:
+            logger.error(f"Error reading {csv_file}: {e}")
+            entry.pop('rallies', None)
+            entry.pop('labels_key', None)
+
+    new_dirs[path] = entry
+    if not recursive:
+        return
+    for subdir in entry['subdirs']:
+        scan_directory(os.path.join(path, subdir), old_dirs, new_dirs, parse_labels)
+
+
+def discover_matches(base_dir, parse_labels, index_file=None, max_workers=8):
+    """Find match directories (mp4 files + rally_labels.csv) under base_dir.
+
+    Returns {match_dir: {'video_files': [...], 'rallies': [...]}}. The top-level children of base_dir
+    are scanned in parallel, and with an index_file the listings and parsed rally lists are persisted
+    so a repeat run only re-lists directories that changed.
+    """
+    index = load_index(index_file)
+    old_dirs = index['dirs'] if index.get('base_dir') == base_dir else {}
+    new_dirs = {}
+
+    # Scan base_dir itself without recursing, then fan its children out over a thread pool
+    scan_directory(base_dir, old_dirs, new_dirs, parse_labels, recursive=False)
+    root_entry = new_dirs.get(base_dir)
+    children = [os.path.join(base_dir, subdir) for subdir in root_entry['subdirs']] if root_entry else []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Each thread writes into its own dict, merged afterwards
+        partials = [{} for _ in children]
+        list(executor.map(lambda args: scan_directory(args[0], old_dirs, args[1], parse_labels),
+                          zip(children, partials)))
+    for partial in partials:
+        new_dirs.update(partial)
+
+    if index_file:
+        save_index({'version': INDEX_VERSION, 'base_dir': base_dir, 'dirs': new_dirs}, index_file)
+
+    reused = sum(1 for path, entry in new_dirs.items() if old_dirs.get(path, {}).get('mtime_ns') == entry['mtime_ns'])
+    logger.info(f"Scanned {len(new_dirs)} directories ({reused} unchanged since the last run)")
+
+    return {
+        path: {'video_files': entry['video_files'], 'rallies': entry['rallies']}
+        for path, entry in sorted(new_dirs.items())
+        if entry['has_labels'] and entry['video_files'] and 'rallies' in entry
+    }
@@ -0,0 +1,44 @@
+"""Per-video analysis caches stored next to the video as .npz files.
+
+Shared by frame_index.py, rally_proposal.py and audio_onsets.py. Every cache holds a 'source' key
+array identifying the video (and the settings) it was computed from, and a cache whose key does not
+match is treated as missing. Caches are written to a temporary file and renamed into place, so a
+reader never sees a half-written file.
+"""
+import os
+import logging
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+def source_key(video_path, version, *settings):
+    """Cache key of video_path: the cache format version, the video's size and mtime, and any settings."""
+    stat = os.stat(video_path)
+    return np.array([version, stat.st_size, stat.st_mtime_ns, *settings], dtype=np.int64)
+
+
+def load_cached_npz(path, key):
+    """The arrays cached at path as a dict, or None if the file is missing, unreadable or has another key."""
+    try:
+        with np.load(path) as data:
+            if not np.array_equal(data['source'], key):
+                return None
+            return {name: data[name] for name in data.files if name != 'source'}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def save_cached_npz(path, key, **arrays):
+    """Cache arrays at path under key, atomically; failures (e.g. read-only media) are only logged."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, source=key, **arrays)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Cannot write cache {path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,85 @@
+"""Low-resolution all-intra proxies of source videos, used by cut_rallies.py for instant seeking.
+
+Every proxy frame is an MJPEG keyframe, so seeking to any frame decodes exactly one small image.
+Frames are passed through one-to-one (no frame rate conversion), so frame numbers and the frame
+rate match the source. The proxy is cached next to the video as <video>.proxy.avi (not .mp4, so
+the cutter never mistakes it for a camera view) and rebuilt when the video is newer.
+"""
+import os
+import logging
+import subprocess
+
+from ffmpeg_process import FFmpegProcess
+
+
+logger = logging.getLogger(__name__)
+
+PROXY_SUFFIX = '.proxy.avi'
+PROXY_HEIGHT = 540
+PROXY_QUALITY = 5  # MJPEG -q:v, 2 (best) to 31
+
+
+def proxy_path(video_path):
+    return video_path + PROXY_SUFFIX
+
+
+def load_proxy(video_path):
+    """Return the cached proxy of video_path, or None if there is none or it is older than the video."""
+    path = proxy_path(video_path)
+    try:
+        if os.path.getmtime(path) >= os.path.getmtime(video_path):
+            return path
+    except OSError:
+        pass
+    return None
+
+
+class ProxyBuild:
+    """Encodes the proxy of a video with ffmpeg in the background.
+
+    poll() is cheap and meant to be called periodically from the UI thread. The proxy is written to a
+    temporary file and renamed into place when complete, so an interrupted build leaves nothing behind.
+    """
+
+    def __init__(self, video_path, height=PROXY_HEIGHT):
+        self.video_path = video_path
+        self.path = proxy_path(video_path)
+        self.tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        cmd = [
+            'ffmpeg',
+            '-y',
+            '-loglevel', 'error',
+            '-i', video_path,
+            '-map', '0:v:0',
+            '-an', '-sn',
+            '-vf', f'scale=-2:{height}',
+            '-vsync', 'passthrough',  # Keep every frame and its timestamp, never duplicate or drop
+            '-c:v', 'mjpeg',
+            '-q:v', str(PROXY_QUALITY),
+            '-f', 'avi',
+            self.tmp_path
+        ]
+        self.process = FFmpegProcess(cmd, stdout=subprocess.DEVNULL)
+
+    def poll(self):
+        """None while encoding; the proxy path once done. Raises RuntimeError if ffmpeg failed."""
+        if self.process.poll() is None:
+            return None
+        try:
+            self.process.check()
+        except RuntimeError:
+            self.remove_tmp()
+            raise
+        finally:
+            self.process.close()
+        os.replace(self.tmp_path, self.path)
+        logger.info(f"Proxy ready: {self.path}")
+        return self.path
+
+    def cancel(self):
+        self.process.close()
+        self.remove_tmp()
+
+    def remove_tmp(self):
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
@@ -0,0 +1,166 @@
+"""Reader and writer for rally_labels.csv, the file exported by cut_rallies.py and consumed by video_cutting.py.
+
+Only the standard library is used, so loading labels stays cheap for the CLI and every worker process.
+"""
+import csv
+from typing import NamedTuple, Optional
+
+
+RALLY_LABEL_COLUMNS = [
+    'Rally Number',
+    'Start Time',
+    'End Time',
+    'Duration',
+    'Start Frame',
+    'End Frame',
+    'Start Seconds',
+    'End Seconds',
+]
+
+# Older exports did not have Duration / Start Seconds / End Seconds yet
+REQUIRED_COLUMNS = ['Rally Number', 'Start Time', 'End Time', 'Start Frame', 'End Frame']
+
+
+class RallyLabelError(ValueError):
+    """Raised when a rally_labels.csv file does not match the expected schema."""
+
+
+class RallyLabel(NamedTuple):
+    """One row of rally_labels.csv."""
+    rally_number: int
+    start_time: str           # HH:MM:SS.mmm
+    end_time: str             # HH:MM:SS.mmm
+    duration: str             # MM:SS.mmm
+    start_frame: int
+    end_frame: int
+    start_seconds: Optional[float] = None
+    end_seconds: Optional[float] = None
+
+    @property
+    def frame_count(self):
+        return self.end_frame - self.start_frame
+
+
+def timestamp_to_seconds(timestamp):
+    """Convert a HH:MM:SS.mmm (or MM:SS.mmm / plain seconds) timestamp to seconds."""
+    seconds = 0.0
+    for part in str(timestamp).split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def frame_to_time(frame_num, fps):
+    """Format a frame number as HH:MM:SS.mmm (milliseconds truncated, as the labeling tool always has)."""
+    if fps <= 0:
+        return "00:00:00"
+
+    total_seconds = frame_num / fps
+    hours = int(total_seconds // 3600)
+    minutes = int((total_seconds % 3600) // 60)
+    seconds = int(total_seconds % 60)
+    milliseconds = int((total_seconds * 1000) % 1000)
+
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+
+
+def format_duration(seconds):
+    """Format a duration in seconds as MM:SS.mmm."""
+    minutes = int(seconds // 60)
+    secs = int(seconds % 60)
+    ms = int((seconds * 1000) % 1000)
+    return f"{minutes:02d}:{secs:02d}.{ms:03d}"
+
+
+def make_rally_label(rally_number, start_frame, end_frame, fps):
+    """Build the label cut_rallies.py exports for a rally marked from start_frame to end_frame."""
+    start_seconds = start_frame / fps
+    end_seconds = end_frame / fps
+    return RallyLabel(
+        rally_number,
+        frame_to_time(start_frame, fps),
+        frame_to_time(end_frame, fps),
+        format_duration(end_seconds - start_seconds),
+        start_frame,
+        end_frame,
+        round(start_seconds, 3),
+        round(end_seconds, 3),
+    )
+
+
+def _parse_int(value, column, line_num, csv_file):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        raise RallyLabelError(f"{csv_file}:{line_num}: invalid {column!r} value {value!r}")
+
+
+def _parse_float(value, column, line_num, csv_file):
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise RallyLabelError(f"{csv_file}:{line_num}: invalid {column!r} value {value!r}")
+
+
+def _parse_timestamp(value, column, line_num, csv_file):
+    try:
+        timestamp_to_seconds(value)
+    except (TypeError, ValueError):
+        raise RallyLabelError(f"{csv_file}:{line_num}: invalid {column!r} timestamp {value!r}")
+    return value
+
+
+def read_rally_labels(csv_file):
+    """Read and validate rally_labels.csv, returning a list of RallyLabel records.
+
+    Raises RallyLabelError on missing columns, malformed values, empty or reversed rallies and
+    duplicate rally numbers.
+    """
+    with open(csv_file, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            raise RallyLabelError(f"{csv_file}: missing columns {', '.join(missing)}")
+
+        labels = []
+        seen = set()
+        for line_num, row in enumerate(reader, start=2):
+            if not any(row.values()):
+                continue  # Blank line
+            label = RallyLabel(
+                _parse_int(row['Rally Number'], 'Rally Number', line_num, csv_file),
+                _parse_timestamp(row['Start Time'], 'Start Time', line_num, csv_file),
+                _parse_timestamp(row['End Time'], 'End Time', line_num, csv_file),
+                row.get('Duration') or '',
+                _parse_int(row['Start Frame'], 'Start Frame', line_num, csv_file),
+                _parse_int(row['End Frame'], 'End Frame', line_num, csv_file),
+                _parse_float(row.get('Start Seconds'), 'Start Seconds', line_num, csv_file),
+                _parse_float(row.get('End Seconds'), 'End Seconds', line_num, csv_file),
+            )
+            if label.end_frame <= label.start_frame:
+                raise RallyLabelError(f"{csv_file}:{line_num}: rally {label.rally_number} ends "
+                                      f"(frame {label.end_frame}) before it starts (frame {label.start_frame})")
+            if label.rally_number in seen:
+                raise RallyLabelError(f"{csv_file}:{line_num}: duplicate rally number {label.rally_number}")
+            seen.add(label.rally_number)
+            labels.append(label)
+    return labels
+
+
+def write_rally_labels(csv_file, labels):
+    """Write RallyLabel records in the exact format cut_rallies.py exports."""
+    with open(csv_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(RALLY_LABEL_COLUMNS)
+        for label in labels:
+            writer.writerow([
+                label.rally_number,
+                label.start_time,
+                label.end_time,
+                label.duration,
+                label.start_frame,
+                label.end_frame,
+                '' if label.start_seconds is None else f"{label.start_seconds:.3f}",
+                '' if label.end_seconds is None else f"{label.end_seconds:.3f}",
+            ])
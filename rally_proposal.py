@@ -0,0 +1,129 @@
+"""Motion-energy rally proposals for cut_rallies.py.
+
+A decimated, downscaled grayscale decode of the video (ANALYSIS_FPS samples per second at
+ANALYSIS_WIDTH x ANALYSIS_HEIGHT) is streamed from ffmpeg in fixed-size chunks, and the mean absolute
+difference between consecutive samples gives a motion-energy signal. Rallies are the stretches where
+the smoothed signal stays high. The signal is cached next to the video as <video>.motion.npz, keyed
+on the video's size and mtime, so proposing again (or with other thresholds) is instant.
+"""
+import numpy as np
+
+from ffmpeg_process import stream_ffmpeg
+from npz_cache import load_cached_npz, save_cached_npz, source_key
+
+
+MOTION_SUFFIX = '.motion.npz'
+MOTION_VERSION = 1
+
+ANALYSIS_FPS = 5
+ANALYSIS_WIDTH = 160
+ANALYSIS_HEIGHT = 90
+CHUNK_SAMPLES = 256  # Samples read and differenced at once (about 3.7 MB)
+
+SMOOTH_SECONDS = 1.0
+THRESHOLD = 0.35          # Between the 10th (0) and 90th (1) percentile of the smoothed signal
+MAX_GAP_SECONDS = 2.0     # Shorter quiet stretches do not split a rally
+MIN_RALLY_SECONDS = 3.0
+PAD_SECONDS = 0.5
+
+
+def motion_path(video_path):
+    return video_path + MOTION_SUFFIX
+
+
+def analysis_step(fps):
+    """Frames between two analysed samples."""
+    return max(1, round((fps or 30) / ANALYSIS_FPS))
+
+
+def compute_motion_energy(video_path, step):
+    """Motion energy of every step-th frame: energy[i] is the mean absolute difference between samples i-1 and i."""
+    cmd = [
+        'ffmpeg',
+        '-loglevel', 'error',
+        '-i', video_path,
+        '-map', '0:v:0',
+        '-an', '-sn',
+        '-vf', f"select='not(mod(n\\,{step}))',scale={ANALYSIS_WIDTH}:{ANALYSIS_HEIGHT},format=gray",
+        '-vsync', 'passthrough',
+        '-f', 'rawvideo',
+        '-pix_fmt', 'gray',
+        'pipe:'
+    ]
+    frame_size = ANALYSIS_WIDTH * ANALYSIS_HEIGHT
+    chunks = []
+    previous = None
+    for data in stream_ffmpeg(cmd, CHUNK_SAMPLES * frame_size):
+        count = len(data) // frame_size
+        if count == 0:
+            continue  # A partial trailing frame
+        frames = np.frombuffer(data, dtype=np.uint8, count=count * frame_size)
+        frames = frames.reshape(count, frame_size).astype(np.int16)
+        if previous is not None:
+            frames = np.concatenate([previous, frames])
+        chunks.append(np.abs(np.diff(frames, axis=0)).mean(axis=1, dtype=np.float32))
+        previous = frames[-1:]
+
+    energy = np.concatenate([np.zeros(1, dtype=np.float32)] + chunks) if chunks else np.zeros(0, dtype=np.float32)
+    return energy
+
+
+def load_motion_energy(video_path, step):
+    """Return the cached motion energy of video_path, or None if there is none or it is out of date."""
+    data = load_cached_npz(motion_path(video_path), source_key(video_path, MOTION_VERSION, step))
+    return data['energy'] if data is not None else None
+
+
+def save_motion_energy(video_path, step, energy):
+    """Cache the signal next to the video."""
+    save_cached_npz(motion_path(video_path), source_key(video_path, MOTION_VERSION, step), energy=energy)
+
+
+def get_motion_energy(video_path, step):
+    """Load the cached motion energy of video_path, computing and caching it if needed."""
+    energy = load_motion_energy(video_path, step)
+    if energy is None:
+        energy = compute_motion_energy(video_path, step)
+        save_motion_energy(video_path, step, energy)
+    return energy
+
+
+def analyse_video(video_path, step, result_queue):
+    """Worker process entry point: puts (video_path, energy or exception) on result_queue."""
+    try:
+        result = get_motion_energy(video_path, step)
+    except Exception as e:
+        result = RuntimeError(str(e))  # Plain exception, so it pickles whatever the original type
+    result_queue.put((video_path, result))
+
+
+def propose_rallies(energy, step, fps, total_frames):
+    """Candidate rallies as [(start_frame, end_frame)] from a motion-energy signal."""
+    if len(energy) < 2:
+        return []
+    samples_per_second = (fps or 30) / step
+
+    window = max(1, round(SMOOTH_SECONDS * samples_per_second))
+    smoothed = np.convolve(energy, np.ones(window) / window, mode='same')
+    low, high = np.percentile(smoothed, [10, 90])
+    if high - low <= 1e-6:
+        return []  # No variation at all (static shot)
+    active = smoothed > low + (high - low) * THRESHOLD
+
+    # Start and (exclusive) end sample of every active run
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], active.astype(np.int8), [0]])))
+    starts, ends = edges[0::2], edges[1::2]
+    if len(starts) == 0:
+        return []
+
+    # Merge runs separated by short quiet gaps, then drop the ones too short to be a rally
+    keep_break = (starts[1:] - ends[:-1]) > MAX_GAP_SECONDS * samples_per_second
+    starts = starts[np.concatenate([[True], keep_break])]
+    ends = ends[np.concatenate([keep_break, [True]])]
+    long_enough = (ends - starts) >= MIN_RALLY_SECONDS * samples_per_second
+    starts, ends = starts[long_enough], ends[long_enough]
+
+    pad = PAD_SECONDS * samples_per_second
+    start_frames = np.maximum(0, np.round((starts - pad) * step)).astype(int)
+    end_frames = np.minimum(total_frames - 1, np.round((ends + pad) * step)).astype(int)
+    return list(zip(start_frames.tolist(), end_frames.tolist()))
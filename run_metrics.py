@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import resource
+
+
+def read_proc_io():
+    """Return this process' cumulative I/O counters from /proc/self/io, or {} where unavailable.
+
+    The kernel folds the counters of reaped children into their parent, so deltas taken around a
+    subprocess call include the bytes read and written by ffmpeg itself.
+    """
+    try:
+        with open('/proc/self/io') as f:
+            return {key: int(value) for key, value in (line.split(':') for line in f if ':' in line)}
+    except (OSError, ValueError):
+        return {}
+
+
+def children_cpu_time():
+    """Return the user + system CPU seconds used by all reaped child processes so far."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def read_process_stats(pid):
+    """Sample CPU seconds and I/O counters of a running process from /proc/<pid>/stat and /proc/<pid>/io.
+
+    Used where several children run concurrently in one process, so RUSAGE_CHILDREN deltas cannot be
+    attributed to a single task. Returns {} once the process is gone.
+    """
+    stats = {}
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # The command name may contain spaces, the numeric fields start after its closing ')'
+            fields = f.read().rsplit(')', 1)[1].split()
+        ticks = os.sysconf('SC_CLK_TCK')
+        stats['cpu_time'] = (int(fields[11]) + int(fields[12])) / ticks  # utime + stime
+        with open(f'/proc/{pid}/io') as f:
+            io = {key: int(value) for key, value in (line.split(':') for line in f if ':' in line)}
+        stats['rchar'] = io.get('rchar', 0)
+        stats['read_bytes'] = io.get('read_bytes', 0)
+    except (OSError, ValueError, IndexError):
+        pass
+    return stats
+
+
+class TaskProbe:
+    """Measure one task running in a worker: wall time, child CPU time and I/O, queue wait."""
+
+    def __init__(self, submitted_at=None):
+        self.submitted_at = submitted_at
+        self.started_at = time.time()
+        self.start_cpu = children_cpu_time()
+        self.start_io = read_proc_io()
+
+    def finish(self, segment_seconds, output_paths, child_stats=None):
+        """Return the task's metrics. child_stats ({'cpu_time', 'rchar', 'read_bytes'} summed over the
+        task's ffmpeg processes) replaces the rusage and /proc/self/io deltas when given."""
+        finished_at = time.time()
+        wall_time = finished_at - self.started_at
+        end_io = read_proc_io()
+        output_bytes = 0
+        for output_path in output_paths:
+            try:
+                output_bytes += os.path.getsize(output_path)
+            except OSError:
+                pass
+        if child_stats is not None:
+            cpu_time = child_stats.get('cpu_time', 0.0)
+            input_bytes = child_stats.get('rchar')
+            disk_read_bytes = child_stats.get('read_bytes')
+        else:
+            cpu_time = children_cpu_time() - self.start_cpu
+            input_bytes = end_io.get('rchar', 0) - self.start_io.get('rchar', 0) if end_io else None
+            disk_read_bytes = end_io.get('read_bytes', 0) - self.start_io.get('read_bytes', 0) if end_io else None
+        return {
+            'started_at': self.started_at,
+            'finished_at': finished_at,
+            'wall_time': wall_time,
+            'cpu_time': cpu_time,
+            'segment_seconds': segment_seconds,
+            'realtime_factor': segment_seconds / wall_time if wall_time > 0 else None,
+            'input_bytes': input_bytes,
+            'disk_read_bytes': disk_read_bytes,
+            'output_bytes': output_bytes,
+            'queue_wait': self.started_at - self.submitted_at if self.submitted_at else None,
+            'worker_pid': os.getpid(),
+        }
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class MetricsRecorder:
+    """Append per-task metrics as JSON lines and summarize them at the end of a run.
+
+    Either output is optional: without a metrics file or Prometheus textfile nothing is written.
+    """
+
+    def __init__(self, metrics_file=None, prometheus_file=None):
+        self.metrics_file = metrics_file
+        self.prometheus_file = prometheus_file
+        self.records = []
+        self.run_started_at = time.time()
+        self.out = open(metrics_file, 'a') if metrics_file else None
+
+    @property
+    def enabled(self):
+        return self.out is not None or self.prometheus_file is not None
+
+    def record(self, metrics):
+        self.records.append(metrics)
+        if self.out:
+            self.out.write(json.dumps({'type': 'task', **metrics}) + '\n')
+            self.out.flush()
+
+    def summary(self, successful, failed):
+        wall_time = time.time() - self.run_started_at
+        segment_seconds = sum(r['segment_seconds'] for r in self.records)
+        queue_waits = [r['queue_wait'] for r in self.records if r.get('queue_wait') is not None]
+        realtime_factors = [r for r in self.records if r.get('realtime_factor')]
+        slowest = sorted(realtime_factors, key=lambda r: r['realtime_factor'])[:5]
+        return {
+            'type': 'summary',
+            'jobs': len(self.records),
+            'successful': successful,
+            'failed': failed,
+            'wall_time': wall_time,
+            'cpu_time': sum(r['cpu_time'] for r in self.records),
+            'segment_seconds': segment_seconds,
+            'realtime_factor': segment_seconds / wall_time if wall_time > 0 else None,
+            'input_bytes': sum(r.get('input_bytes') or 0 for r in self.records),
+            'disk_read_bytes': sum(r.get('disk_read_bytes') or 0 for r in self.records),
+            'output_bytes': sum(r['output_bytes'] for r in self.records),
+            'queue_wait_mean': sum(queue_waits) / len(queue_waits) if queue_waits else None,
+            'queue_wait_p95': percentile(queue_waits, 0.95),
+            'slowest_jobs': [
+                {'input_video': r.get('input_video'), 'rallies': r.get('rallies'), 'realtime_factor': r['realtime_factor']}
+                for r in slowest
+            ],
+        }
+
+    def write_prometheus(self, summary):
+        """Write the run summary in the node_exporter textfile-collector format (atomically)."""
+        metrics = [
+            ('video_cutting_jobs', 'gauge', 'ffmpeg jobs run in the last batch', summary['jobs']),
+            ('video_cutting_tasks_successful', 'gauge', 'Rally clips cut successfully', summary['successful']),
+            ('video_cutting_tasks_failed', 'gauge', 'Rally clips that failed', summary['failed']),
+            ('video_cutting_wall_seconds', 'gauge', 'Wall time of the last batch', summary['wall_time']),
+            ('video_cutting_cpu_seconds', 'gauge', 'CPU time used by ffmpeg children', summary['cpu_time']),
+            ('video_cutting_segment_seconds', 'gauge', 'Seconds of video cut', summary['segment_seconds']),
+            ('video_cutting_realtime_factor', 'gauge', 'Segment seconds per wall second', summary['realtime_factor']),
+            ('video_cutting_input_bytes', 'gauge', 'Bytes read by ffmpeg children', summary['input_bytes']),
+            ('video_cutting_output_bytes', 'gauge', 'Bytes of clips written', summary['output_bytes']),
+            ('video_cutting_queue_wait_p95_seconds', 'gauge', '95th percentile queue wait', summary['queue_wait_p95']),
+            ('video_cutting_last_run_timestamp_seconds', 'gauge', 'End of the last batch', time.time()),
+        ]
+        lines = []
+        for name, metric_type, help_text, value in metrics:
+            if value is None:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f"{name} {value}")
+        tmp_path = f"{self.prometheus_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        # The collector may read the file at any time, so never let it see a partial write
+        os.replace(tmp_path, self.prometheus_file)
+
+    def close(self, successful, failed):
+        """Write the summary record / textfile and return the summary."""
+        summary = self.summary(successful, failed)
+        if self.out:
+            self.out.write(json.dumps(summary) + '\n')
+            self.out.close()
+            self.out = None
+        if self.prometheus_file:
+            self.write_prometheus(summary)
+        return summary
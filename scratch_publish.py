@@ -0,0 +1,110 @@
+import os
+import shutil
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+# Concurrent copies from the scratch directory to the output tree
+UPLOAD_THREADS = 2
+
+
+def publish_file(scratch_path, output_path):
+    """Copy a finished output next to its destination, then rename it into place atomically.
+
+    The copy goes to a hidden .part file in the destination directory, so the final name only ever
+    refers to a complete clip, even if the copy is interrupted. Returns output_path.
+    """
+    tmp_path = os.path.join(os.path.dirname(output_path), f".{os.path.basename(output_path)}.part")
+    try:
+        # One bulk sequential copy (sendfile on Linux) instead of ffmpeg's small writes and seeks
+        shutil.copyfile(scratch_path, tmp_path)
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        if os.path.exists(scratch_path):
+            os.remove(scratch_path)
+    return output_path
+
+
+def scratch_usage(scratch_dir):
+    """Bytes currently used by files under scratch_dir (finished clips and encodes in progress)."""
+    total = 0
+    for root, dirs, files in os.walk(scratch_dir):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # Removed while walking
+    return total
+
+
+class OutputPublisher:
+    """Stage outputs in a local scratch directory and upload them to the output tree in background threads.
+
+    stage() points a task's output_path at the scratch directory, publish() queues a finished output
+    for upload and completed() hands back the uploads that finished since its last call. is_full()
+    tells the caller to stop starting new encodes while the scratch directory holds max_bytes or more.
+    """
+
+    def __init__(self, scratch_dir, max_bytes=None, upload_threads=UPLOAD_THREADS):
+        self.scratch_dir = scratch_dir
+        self.max_bytes = max_bytes
+        self.targets = {}  # scratch path -> final output path
+        self.uploads = []  # (key, output_path, future)
+        self.executor = ThreadPoolExecutor(max_workers=upload_threads, thread_name_prefix='publish')
+        os.makedirs(scratch_dir, exist_ok=True)
+
+    def stage(self, task):
+        """Redirect task['output_path'] into the scratch directory; returns the scratch path."""
+        output_path = task['output_path']
+        digest = hashlib.md5(output_path.encode()).hexdigest()[:12]
+        scratch_path = os.path.join(self.scratch_dir, f"{digest}_{os.path.basename(output_path)}")
+        self.targets[scratch_path] = output_path
+        task['output_path'] = scratch_path
+        return scratch_path
+
+    def final_path(self, scratch_path):
+        return self.targets[scratch_path]
+
+    def publish(self, scratch_path, key=None):
+        """Queue a finished output for upload; returns its final path."""
+        output_path = self.targets.pop(scratch_path)
+        self.uploads.append((key, output_path, self.executor.submit(publish_file, scratch_path, output_path)))
+        return output_path
+
+    def discard(self, scratch_path):
+        """Forget a staged output that will not be published (failed encode)."""
+        self.targets.pop(scratch_path, None)
+        if os.path.exists(scratch_path):
+            os.remove(scratch_path)
+
+    def completed(self, wait=False):
+        """Return [(key, output_path, error)] for uploads finished since the last call (error is None on success)."""
+        finished = []
+        running = []
+        for key, output_path, future in self.uploads:
+            if wait or future.done():
+                try:
+                    future.result()
+                    finished.append((key, output_path, None))
+                except Exception as e:
+                    finished.append((key, output_path, e))
+            else:
+                running.append((key, output_path, future))
+        self.uploads = running
+        return finished
+
+    def is_full(self):
+        # Only while uploads are pending: otherwise waiting would never free any space
+        return self.max_bytes is not None and bool(self.uploads) and scratch_usage(self.scratch_dir) >= self.max_bytes
+
+    def close(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,131 @@
+import os
+import json
+import sqlite3
+import time
+import hashlib
+
+
+# Bytes hashed from the head and the tail of a source file for its optional content fingerprint
+PARTIAL_HASH_BYTES = 1024 * 1024
+
+
+def get_source_identity(input_video, content_hash=False):
+    """Identify a source file by size and mtime, plus an optional hash of its first and last MiB.
+
+    Unlike the path alone, this changes when a source is replaced or re-exported under the same name.
+    """
+    stat = os.stat(input_video)
+    identity = f"{stat.st_size}:{stat.st_mtime_ns}"
+    if content_hash:
+        md5 = hashlib.md5()
+        with open(input_video, 'rb') as f:
+            md5.update(f.read(PARTIAL_HASH_BYTES))
+            if stat.st_size > PARTIAL_HASH_BYTES:
+                f.seek(max(PARTIAL_HASH_BYTES, stat.st_size - PARTIAL_HASH_BYTES))
+                md5.update(f.read(PARTIAL_HASH_BYTES))
+        identity += f":{md5.hexdigest()}"
+    return identity
+
+
+class TaskJournal:
+    """Crash-safe record of finished cutting tasks, backed by an embedded SQLite database.
+
+    Every finished task is committed on its own as soon as it completes, so killing the process
+    mid-run loses at most the tasks that were still encoding. All rows are loaded into memory on
+    open, which keeps lookups O(1) even for 100k+ tasks.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        # WAL + synchronous=NORMAL: each commit is atomic and durable against process crashes
+        # without an fsync of the whole database per task
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " task_key TEXT PRIMARY KEY,"
+            " output_path TEXT NOT NULL,"
+            " output_size INTEGER NOT NULL,"
+            " finished_at REAL NOT NULL)"
+        )
+        # Outputs recorded by the JSON-cache cutter (processed_videos.json), keyed by its own task hash
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS legacy_tasks ("
+            " legacy_key TEXT PRIMARY KEY,"
+            " output_path TEXT NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS legacy_imports ("
+            " json_path TEXT PRIMARY KEY,"
+            " imported_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+        self.legacy = dict(self.conn.execute("SELECT legacy_key, output_path FROM legacy_tasks"))
+        self.done = {
+            task_key: (output_path, output_size)
+            for task_key, output_path, output_size in self.conn.execute(
+                "SELECT task_key, output_path, output_size FROM tasks")
+        }
+
+    def __len__(self):
+        return len(self.done)
+
+    def __contains__(self, task_key):
+        return task_key in self.done
+
+    def is_done(self, task_key, output_path):
+        """Return True if the task finished and its output is still on disk, unchanged, at output_path."""
+        entry = self.done.get(task_key)
+        if entry is None:
+            return False
+        recorded_path, recorded_size = entry
+        if recorded_path != output_path:
+            return False
+        try:
+            return os.path.getsize(output_path) == recorded_size
+        except OSError:
+            return False
+
+    def record(self, task_key, output_path):
+        """Atomically record a finished task together with the size of its output."""
+        output_size = os.path.getsize(output_path)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO tasks (task_key, output_path, output_size, finished_at) VALUES (?, ?, ?, ?)",
+                (task_key, output_path, output_size, time.time())
+            )
+        self.done[task_key] = (output_path, output_size)
+
+    def import_legacy(self, json_path):
+        """Import a {task hash: output path} processed_videos.json of the JSON-cache cutter, once per file.
+
+        Returns the number of imported entries, or None if the file does not exist or was imported
+        before. Raises OSError or ValueError if it cannot be read.
+        """
+        json_path = os.path.abspath(json_path)
+        if not os.path.exists(json_path) or self.conn.execute(
+                "SELECT 1 FROM legacy_imports WHERE json_path = ?", (json_path,)).fetchone():
+            return None
+        with open(json_path) as f:
+            entries = json.load(f)
+        if not isinstance(entries, dict):
+            raise ValueError("expected a JSON object of task hashes")
+        entries = {key: path for key, path in entries.items() if isinstance(path, str)}
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO legacy_tasks (legacy_key, output_path) VALUES (?, ?)", entries.items())
+            self.conn.execute(
+                "INSERT INTO legacy_imports (json_path, imported_at) VALUES (?, ?)", (json_path, time.time()))
+        self.legacy.update(entries)
+        return len(entries)
+
+    def adopt_legacy(self, legacy_key, task_key, output_path):
+        """Record task_key as finished if the JSON-cache cutter wrote output_path for legacy_key and it still exists."""
+        if self.legacy.get(legacy_key) != output_path or not os.path.exists(output_path):
+            return False
+        self.record(task_key, output_path)
+        return True
+
+    def close(self):
+        self.conn.close()
@@ -1,14 +1,16 @@
 import os
+import sys
+import json
 import subprocess
-import pandas as pd
 import argparse
-from pathlib import Path
-import multiprocessing
-from concurrent.futures import ProcessPoolExecutor, as_completed
 import time
 import logging
 import hashlib
-import json
+import tempfile
+
+from run_metrics import MetricsRecorder, TaskProbe, read_process_stats
+from rally_labels import RallyLabel, RallyLabelError, read_rally_labels, timestamp_to_seconds
+from match_index import LABELS_FILE, discover_matches, sort_video_files
 
 
 logging.basicConfig(
@@ -16,7 +18,7 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler(),
-        logging.FileHandler("video_cutting.log")
+        logging.FileHandler("video_cutting.log", delay=True)  # Only create the log once something is logged
     ]
 )
 
@@ -26,52 +28,319 @@ def create_directory(directory):
     """ Create a directory if it doesn't exist."""
     os.makedirs(directory, exist_ok=True)
     
-def get_video_hash(input_video, start_time, end_time):
-    """Generate a hash for a video segment based on its path and cut times for video cutting."""
-    hash_input = f"{input_video}_{start_time}_{end_time}"
+def get_video_hash(source_identity, start_time, end_time, cut_mode="reencode"):
+    """Generate a hash for a video segment from its source identity, cut times and encode parameters."""
+    encode_params = ' '.join(COPY_ARGS if cut_mode == 'copy' else REENCODE_ARGS)
+    hash_input = f"{source_identity}_{start_time}_{end_time}_{cut_mode}_{encode_params}"
     # hashlib.md5() returns  an Md5 hash object, and hexdigest() converts it to a 32-charactory hexadecimal string.
     return hashlib.md5(hash_input.encode()).hexdigest()
 
-def laod_processed_videos(cache_file): # e.g. "processed_videos.json"
-    """ Load the list of already processed videos from cache file"""
-    if os.path.exists(cache_file):
-        try:
-            with open(cache_file, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading cache file: {e}")
-            return {}
-    return {}
+def get_legacy_video_hash(input_video, start_time, end_time):
+    """Task hash of the JSON-cache cutter (source path and cut times only), used to take over its outputs."""
+    return hashlib.md5(f"{input_video}_{start_time}_{end_time}".encode()).hexdigest()
+
+# Cutting modes:
+#   reencode - re-encode the whole segment with libx264/aac (slowest, always frame-accurate)
+#   copy     - stream-copy the segment (fastest, starts on the keyframe before the start time)
+#   smart    - re-encode only the partial GOP up to the first keyframe, stream-copy the rest
+#   virtual  - write no video, only ffconcat descriptors pointing into the source files
+CUT_MODES = ('reencode', 'copy', 'smart', 'virtual')
+
+VIRTUAL_CLIP_EXT = '.ffconcat'
+
+# Maximum number of rallies written by one ffmpeg process in fan-out mode. Every output holds its own
+# encoder, so batching keeps memory bounded while each batch still reads its span of the source once.
+FANOUT_BATCH_SIZE = 16
+
+REENCODE_ARGS = [
+    '-c:v', 'libx264',  # Video codec
+    '-preset', 'fast',  # Encoding speed/quality balance
+    '-crf', '22',       # Quality (lower = better)
+    '-c:a', 'aac',      # Audio codec
+    '-b:a', '128k',     # Audio bitrate
+]
+
+COPY_ARGS = [
+    '-c', 'copy',                      # Stream-copy audio and video
+    '-avoid_negative_ts', 'make_zero', # Shift timestamps so the clip starts at 0
+]
 
 
-def save_processed_videos(processed_videos, cache_file):
-    """ Save the list of processed videos to cache file"""
+def run_ffmpeg(cmd):
+    """Run an ffmpeg/ffprobe command, raising CalledProcessError on failure."""
+    return subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+
+def stream_probe_command(input_video):
+    """ffprobe command describing the streams of input_video (codec parameters and start time)."""
+    return [
+        'ffprobe',
+        '-v', 'error',
+        '-show_entries', 'stream=codec_type,codec_name,profile,level,pix_fmt,sample_rate,channels,start_time',
+        '-of', 'json',
+        input_video
+    ]
+
+
+def parse_stream_probe(probe_output):
+    """(first video stream, first audio stream or None) from ffprobe JSON output."""
+    streams = json.loads(probe_output).get('streams') or []
+    video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+    if video is None:
+        raise ValueError("no video stream")
+    return video, audio
+
+
+def stream_start_time(stream):
+    """Start time of a stream in seconds (packet timestamps are offset by it, input-side -ss is not)."""
     try:
-        with open(cache_file, 'w') as f:
-            json.dump(processed_videos, f)
-    except Exception as e:
-        logger.error(f"Error saving cache file: {e}")
-        
-def cut_video(input_video, output_path, start_time, end_time):
-    """ Cut a video segment using ffmpeg."""
+        return float(stream.get('start_time', 0))
+    except (TypeError, ValueError):
+        return 0.0  # 'N/A'
+
+
+def keyframe_probe_command(input_video, start_seconds, end_seconds, offset=0.0):
+    """ffprobe command listing the video packets (pts + flags) around [start_seconds, end_seconds).
+    
+    -read_intervals works on packet timestamps, so the stream start time is passed as offset.
+    """
+    return [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-read_intervals', f"{offset + start_seconds:.3f}%{offset + end_seconds:.3f}",
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        input_video
+    ]
+
+
+def parse_next_keyframe(probe_output, start_seconds, end_seconds, offset=0.0):
+    """Return the earliest keyframe in [start_seconds, end_seconds) from ffprobe packet output.
+    
+    Packet timestamps are converted to seconds from the start of the stream by subtracting offset,
+    the stream start time, so the result can be used as an input-side -ss.
+    """
+    keyframes = []
+    for line in probe_output.splitlines():
+        fields = line.strip().split(',')
+        if len(fields) < 2 or fields[0] in ('', 'N/A'):
+            continue
+        pts = float(fields[0]) - offset
+        # Packets come in decode order, so collect every keyframe in range and take the earliest
+        if 'K' in fields[1] and start_seconds <= pts < end_seconds:
+            keyframes.append(pts)
+    return min(keyframes) if keyframes else None
+
+
+def find_next_keyframe(input_video, start_seconds, end_seconds, offset=0.0):
+    """Return the time of the first video keyframe in [start_seconds, end_seconds), or None."""
+    result = run_ffmpeg(keyframe_probe_command(input_video, start_seconds, end_seconds, offset))
+    return parse_next_keyframe(result.stdout, start_seconds, end_seconds, offset)
+
+
+# ffprobe profile names of H.264 and the matching libx264 -profile:v
+H264_PROFILES = {
+    'Constrained Baseline': 'baseline',
+    'Baseline': 'baseline',
+    'Main': 'main',
+    'High': 'high',
+    'High 10': 'high10',
+    'High 4:2:2': 'high422',
+    'High 4:4:4 Predictive': 'high444',
+}
+
+
+def head_encode_args(video, audio):
+    """Encoder arguments for a smart-cut head that matches the source streams, or None if they cannot be matched.
+    
+    The head is encoded with the source's profile, level and pixel format, and its audio with the
+    source's sample rate and channel layout, so the stream-copied tail can follow it in one file.
+    Only H.264 video with AAC (or no) audio is supported.
+    """
+    profile = H264_PROFILES.get(video.get('profile'))
+    level = video.get('level')
+    if video.get('codec_name') != 'h264' or profile is None or not isinstance(level, int) or level <= 0 \
+            or not video.get('pix_fmt'):
+        return None
+    args = [
+        '-c:v', 'libx264',
+        '-preset', 'fast',
+        '-crf', '22',
+        '-profile:v', profile,
+        '-level:v', f"{level / 10:.1f}",  # ffprobe reports level 4.1 as 41
+        '-pix_fmt', video['pix_fmt'],
+    ]
+    if audio is None:
+        return args + ['-an']
+    if audio.get('codec_name') != 'aac' or not audio.get('sample_rate') or not audio.get('channels'):
+        return None
+    return args + [
+        '-c:a', 'aac',
+        '-b:a', '128k',
+        '-ar', str(audio['sample_rate']),
+        '-ac', str(audio['channels']),
+    ]
+
+
+def thread_args(threads):
+    """ffmpeg arguments limiting a codec to an explicit number of threads (None keeps ffmpeg's default)."""
+    return ['-threads', str(threads)] if threads else []
+
+
+def segment_command(input_video, output_path, start_seconds, end_seconds, codec_args, frame_count=None, threads=None):
+    """ffmpeg command cutting [start_seconds, end_seconds) of input_video into output_path.
+    
+    Seeking happens on the input side: ffmpeg jumps to the keyframe before start_seconds instead of
+    decoding the file from frame 0. When re-encoding, frames between that keyframe and start_seconds
+    are decoded and dropped, so the cut stays frame-accurate. frame_count pins the exact number of
+    video frames written (End Frame - Start Frame). threads caps both the decoder and the encoder.
+    """
     cmd = [
         'ffmpeg',
         '-loglevel', 'error',  # Reduce ffmpeg output verbosity
+        *thread_args(threads),                         # Decoder threads
+        '-ss', f"{start_seconds:.6f}",                 # Start time (input side seek)
         '-i', input_video,
-        '-ss', start_time,  # Start time
-        '-to', end_time,    # End time
-        '-c:v', 'libx264',  # Video codec
-        '-preset', 'fast',  # Encoding speed/quality balance
-        '-crf', '22',       # Quality (lower = better)
-        '-c:a', 'aac',      # Audio codec
-        '-b:a', '128k',     # Audio bitrate
+        '-t', f"{end_seconds - start_seconds:.6f}",    # Duration
+    ]
+    if frame_count is not None:
+        cmd += ['-frames:v', str(frame_count)]
+    cmd += [
+        *codec_args,
+        *thread_args(threads),  # Encoder threads
         '-y',               # Overwrite output without asking
         output_path
     ]
+    return cmd
+
+
+def cut_segment(input_video, output_path, start_seconds, end_seconds, codec_args, frame_count=None, threads=None):
+    """Cut [start_seconds, end_seconds) of input_video into output_path with the given codec arguments."""
+    run_ffmpeg(segment_command(input_video, output_path, start_seconds, end_seconds, codec_args, frame_count, threads))
+
+
+def smart_cut_commands(input_video, output_path, start_seconds, end_seconds, keyframe, head_args, tmp_dir,
+                       frame_count=None, threads=None):
+    """ffmpeg commands of a smart cut, given the first keyframe inside the segment (or None) and the
+    source-matched head encoder arguments from head_encode_args (or None).
+    
+    Head and tail are written as MPEG-TS with in-band SPS/PPS, so the joined file carries the parameter
+    sets of each part instead of only those of the head. Intermediate files are written to tmp_dir,
+    which must be on the same filesystem as output_path.
+    """
+    if keyframe is None or (head_args is None and keyframe - start_seconds >= 0.001):
+        # The whole rally lives inside one GOP (re-encoding it is cheap anyway), or the head
+        # cannot be encoded to match the source
+        return [segment_command(input_video, output_path, start_seconds, end_seconds, REENCODE_ARGS, frame_count,
+                                threads)]
+    
+    if keyframe - start_seconds < 0.001:
+        # The rally starts on a keyframe, nothing to re-encode
+        return [segment_command(input_video, output_path, keyframe, end_seconds, COPY_ARGS, threads=threads)]
+    
+    head_path = os.path.join(tmp_dir, 'head.ts')
+    tail_path = os.path.join(tmp_dir, 'tail.ts')
+    list_path = os.path.join(tmp_dir, 'concat.txt')
+    with open(list_path, 'w') as f:
+        f.write(f"file '{head_path}'\nfile '{tail_path}'\n")
+    
+    ts_args = ['-bsf:v', 'h264_mp4toannexb', '-f', 'mpegts']
+    return [
+        segment_command(input_video, head_path, start_seconds, keyframe, head_args + ts_args, threads=threads),
+        segment_command(input_video, tail_path, keyframe, end_seconds, COPY_ARGS + ts_args, threads=threads),
+        [
+            'ffmpeg',
+            '-loglevel', 'error',
+            '-f', 'concat',
+            '-safe', '0',
+            '-i', list_path,
+            '-c', 'copy',
+            '-bsf:a', 'aac_adtstoasc',  # ADTS headers of MPEG-TS audio back to MP4 style
+            '-y',
+            output_path
+        ],
+    ]
+
+
+# A smart cut whose output differs from the rally by more than this is redone with a full re-encode
+SMART_CUT_TOLERANCE_SECONDS = 0.1
+SMART_CUT_TOLERANCE_FRAMES = 2
+
+
+def clip_probe_command(path):
+    """ffprobe command reporting the duration and the video frame count of a cut clip."""
+    return [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-count_packets',
+        '-show_entries', 'stream=nb_read_packets:format=duration',
+        '-of', 'json',
+        path
+    ]
+
+
+def check_smart_cut(probe_output, duration, frame_count=None):
+    """Raise ValueError unless the clip probed by clip_probe_command has the rally's duration and frame count.
     
+    ffmpeg exits with 0 even when the joined head and tail do not decode, so the result is checked.
+    """
+    probe = json.loads(probe_output)
+    streams = probe.get('streams') or [{}]
+    try:
+        clip_duration = float(probe.get('format', {}).get('duration'))
+        clip_frames = int(streams[0].get('nb_read_packets'))
+    except (TypeError, ValueError):
+        raise ValueError("cut clip has no readable duration or video stream")
+    if abs(clip_duration - duration) > SMART_CUT_TOLERANCE_SECONDS:
+        raise ValueError(f"cut clip lasts {clip_duration:.3f}s instead of {duration:.3f}s")
+    if frame_count is not None and abs(clip_frames - frame_count) > SMART_CUT_TOLERANCE_FRAMES:
+        raise ValueError(f"cut clip has {clip_frames} frames instead of {frame_count}")
+
+
+def smart_cut(input_video, output_path, start_seconds, end_seconds, frame_count=None, threads=None):
+    """Re-encode only the head of the segment up to the first keyframe and stream-copy the rest.
+    
+    The head is encoded to match the source (see head_encode_args). Falls back to a full re-encode when
+    there is no keyframe inside the segment, the source cannot be matched, any step fails, or the
+    joined clip does not have the expected duration and frame count.
+    """
+    output_dir = os.path.dirname(output_path) or '.'
+    with tempfile.TemporaryDirectory(dir=output_dir, prefix='.smartcut_') as tmp_dir:
+        try:
+            video, audio = parse_stream_probe(run_ffmpeg(stream_probe_command(input_video)).stdout)
+            keyframe = find_next_keyframe(input_video, start_seconds, end_seconds, stream_start_time(video))
+            head_args = head_encode_args(video, audio)
+            if head_args is None:
+                logger.info(f"Cannot match the codec parameters of {input_video}, re-encoding the whole rally")
+            for cmd in smart_cut_commands(input_video, output_path, start_seconds, end_seconds, keyframe, head_args,
+                                          tmp_dir, frame_count, threads):
+                run_ffmpeg(cmd)
+            check_smart_cut(run_ffmpeg(clip_probe_command(output_path)).stdout, end_seconds - start_seconds,
+                            frame_count)
+        except (subprocess.CalledProcessError, ValueError) as e:
+            logger.warning(f"Smart cut failed for {input_video}, falling back to re-encode: {e}")
+            cut_segment(input_video, output_path, start_seconds, end_seconds, REENCODE_ARGS, frame_count, threads)
+
+
+def cut_video(input_video, output_path, start_time, end_time, cut_mode="reencode", frame_count=None, threads=None):
+    """ Cut a video segment using ffmpeg."""
     try:
-        subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        logger.info(f"Successfully cut video: {input_video} from {start_time} to {end_time}")
+        if cut_mode == 'reencode':
+            cut_segment(input_video, output_path, timestamp_to_seconds(start_time), timestamp_to_seconds(end_time),
+                        REENCODE_ARGS, frame_count, threads)
+        elif cut_mode == 'copy':
+            cut_segment(input_video, output_path, timestamp_to_seconds(start_time), timestamp_to_seconds(end_time), COPY_ARGS,
+                        threads=threads)
+        elif cut_mode == 'smart':
+            smart_cut(input_video, output_path, timestamp_to_seconds(start_time), timestamp_to_seconds(end_time),
+                      frame_count, threads)
+        else:
+            raise ValueError(f"Unknown cut mode: {cut_mode}")
+        
+        logger.info(f"Successfully cut video ({cut_mode}): {input_video} from {start_time} to {end_time}")
         return True, output_path
     except subprocess.CalledProcessError as e:
         logger.error(f"Error cutting video {input_video} from {start_time} to {end_time}: {e}")
@@ -79,32 +348,370 @@ def cut_video(input_video, output_path, start_time, end_time):
     
 def process_video_task(task):
     """Process a single video cutting task."""
-    input_video, output_path, start_time, end_time, rally_num, view, task_hash = task
-    
-    # Check if the output file already exists and has a reasonable size
-    if os.path.exists(output_path) and os.path.getsize(output_path) > 10000:  # 10KB min size
-        logger.info(f"Skipping existing file: {output_path}")
-        return True, output_path, task_hash
+    input_video = task['input_video']
+    output_path = task['output_path']
+    start_time = task['start_time']
+    end_time = task['end_time']
+    task_hash = task['task_hash']
     
-    logger.info(f"Processing Rally {rally_num}, View {view}: {start_time} to {end_time}")
-    success, output_path = cut_video(input_video, output_path, start_time, end_time)
+    logger.info(f"Processing Rally {task['rally_num']}, View {task['view']}: {start_time} to {end_time}")
+    frame_count = task['end_frame'] - task['start_frame']
+    success, output_path = cut_video(input_video, output_path, start_time, end_time, task['cut_mode'], frame_count,
+                                     task.get('threads'))
     return success, output_path, task_hash
 
 
-def find_video_directories(base_dir):
-    """Find all directories containing mp4 files and rally_labels.csv."""
-    result = []
-    for root, dirs, files in os.walk(base_dir):
-        # Check if the directory contains mp4 files and a rally_labels.csv file
-        if 'rally_labels.csv' in files and any(f.endswith('.mp4') for f in files):
-            result.append(root)
-    return result
+
+def group_tasks_by_source(tasks, batch_size=FANOUT_BATCH_SIZE):
+    """Group rally tasks by source video into batches of consecutive rallies for fan-out cutting."""
+    by_source = {}
+    for task in tasks:
+        by_source.setdefault(task['input_video'], []).append(task)
+    
+    groups = []
+    for input_video, source_tasks in by_source.items():
+        source_tasks.sort(key=lambda t: timestamp_to_seconds(t['start_time']))
+        for i in range(0, len(source_tasks), batch_size):
+            segments = source_tasks[i:i + batch_size]
+            # The whole span between the rallies is decoded, not only the rallies themselves
+            cost = sum(segment.get('cost', 0.0) for segment in segments)
+            duration = segments_duration(segments)
+            if duration > 0:
+                cost *= max(segments_span(segments), duration) / duration
+            groups.append({
+                'input_video': input_video,
+                'segments': segments,
+                'cost': cost,
+            })
+    return groups
 
 
-def process_videos_parallel(video_dirs, output_dir, max_workers=None, cache_file="processed_videos.json"):
+def fanout_command(input_video, segments, threads=None):
+    """ffmpeg command cutting several rallies of one source with a single process.
+    
+    The source is opened and probed once and decoded in one sequential pass: the input is seeked to the
+    first rally of the batch, and every rally is written as its own output with output-side -ss/-t, which
+    drops frames outside the rally from the shared decode. Segments must be sorted by start time.
+    
+    threads is the budget of the whole job, like for segment_command: the decoder gets all of it and
+    the encoders of the outputs share it (at least one thread each).
+    """
+    batch_start = timestamp_to_seconds(segments[0]['start_time'])
+    encoder_threads = max(1, threads // len(segments)) if threads else None
+    cmd = [
+        'ffmpeg',
+        '-loglevel', 'error',  # Reduce ffmpeg output verbosity
+        *thread_args(threads),        # Decoder threads
+        '-ss', f"{batch_start:.6f}",  # Seek to the first rally of the batch (input side)
+        '-i', input_video,
+    ]
+    for segment in segments:
+        # Input timestamps restart at 0 after the input seek, so offsets are relative to the batch start
+        start_seconds = timestamp_to_seconds(segment['start_time']) - batch_start
+        end_seconds = timestamp_to_seconds(segment['end_time']) - batch_start
+        cmd += [
+            '-ss', f"{start_seconds:.6f}",
+            '-t', f"{end_seconds - start_seconds:.6f}",
+            '-frames:v', str(segment['end_frame'] - segment['start_frame']),
+            *REENCODE_ARGS,
+            *thread_args(encoder_threads),
+            '-y',
+            segment['output_path']
+        ]
+    return cmd
+
+
+def cut_video_fanout(input_video, segments, threads=None):
+    """Cut several rallies of one source with a single ffmpeg process."""
+    run_ffmpeg(fanout_command(input_video, segments, threads))
+
+
+def process_source_task(group):
+    """Process a batch of rallies from one source video in a single ffmpeg pass."""
+    input_video = group['input_video']
+    pending = group['segments']
+    
+    rally_nums = ', '.join(str(segment['rally_num']) for segment in pending)
+    logger.info(f"Processing {len(pending)} rallies ({rally_nums}) from {input_video} in one pass")
+    try:
+        cut_video_fanout(input_video, pending, group.get('threads'))
+        logger.info(f"Successfully cut {len(pending)} rallies from {input_video}")
+        success = True
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Error cutting rallies ({rally_nums}) from {input_video}: {e}")
+        success = False
+    
+    return [(success, segment['output_path'], segment['task_hash']) for segment in pending]
+
+
+def run_work_item(item):
+    """Run one work item (a single rally or a fan-out batch) in a worker and measure it.
+    
+    Returns the per-rally results together with the task's telemetry.
+    """
+    probe = TaskProbe(item.get('submitted_at'))
+    segments = work_item_segments(item)
+    if 'segments' in item:
+        results = process_source_task(item)
+    else:
+        results = [process_video_task(item)]
+    
+    return results, work_item_metrics(item, segments, results, probe)
+
+
+def work_item_segments(item):
+    """The rally tasks covered by a work item."""
+    return item['segments'] if 'segments' in item else [item]
+
+
+def segments_duration(segments):
+    return sum(timestamp_to_seconds(s['end_time']) - timestamp_to_seconds(s['start_time']) for s in segments)
+
+
+def segments_span(segments):
+    """Seconds of source decoded to cut segments in one pass: from the first start to the last end."""
+    return (max(timestamp_to_seconds(s['end_time']) for s in segments) -
+            min(timestamp_to_seconds(s['start_time']) for s in segments))
+
+
+def work_item_metrics(item, segments, results, probe, child_stats=None):
+    """Finish a TaskProbe and label the metrics with the work item they belong to."""
+    metrics = probe.finish(segments_duration(segments), [output_path for success, output_path, _ in results if success],
+                           child_stats)
+    metrics.update({
+        'input_video': item['input_video'],
+        'rallies': [str(s['rally_num']) for s in segments],
+        'cut_mode': segments[0]['cut_mode'],
+        'threads': item.get('threads'),
+        'success': all(success for success, _, _ in results),
+    })
+    return metrics
+
+# Relative CPU cost of one second of 1080p video per cut mode, used to order the task queue
+CUT_MODE_COST = {
+    'reencode': 1.0,
+    'smart': 0.1,   # Only the partial GOP before the first keyframe is encoded
+    'copy': 0.02,   # Pure I/O
+}
+
+REFERENCE_PIXELS = 1920 * 1080
+
+# Per-task timeout of the asyncio engine: TIMEOUT_MIN_SECONDS + TIMEOUT_FACTOR x segment seconds
+TIMEOUT_MIN_SECONDS = 120
+TIMEOUT_FACTOR = 10
+
+ENGINES = ('asyncio', 'process')
+
+# Seconds without a heartbeat after which a queue worker is considered dead and its task is reclaimed
+QUEUE_LEASE_TIMEOUT = 120
+
+# Default cap on local scratch space used by --scratch_dir
+SCRATCH_MAX_GB = 20
+
+# Watch mode: a changed match directory must be quiet for WATCH_DEBOUNCE seconds before it is cut
+WATCH_DEBOUNCE = 10
+WATCH_POLL_INTERVAL = 30
+
+
+def probe_video_resolution(input_video):
+    """Return (width, height) of the first video stream, or None if it cannot be probed."""
+    cmd = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height',
+        '-of', 'csv=p=0:s=x',
+        input_video
+    ]
+    try:
+        result = run_ffmpeg(cmd)
+        width, height = result.stdout.strip().splitlines()[0].split('x')[:2]
+        return int(width), int(height)
+    except (subprocess.CalledProcessError, OSError, ValueError, IndexError) as e:
+        logger.warning(f"Could not probe resolution of {input_video}: {e}")
+        return None
+
+
+def estimate_task_cost(task, resolution=None):
+    """Estimate the CPU cost of a task in 1080p-seconds from its duration, source resolution and cut mode."""
+    duration = timestamp_to_seconds(task['end_time']) - timestamp_to_seconds(task['start_time'])
+    width, height = resolution or (1920, 1080)
+    return max(duration, 0.0) * (width * height / REFERENCE_PIXELS) * CUT_MODE_COST.get(task['cut_mode'], 1.0)
+
+
+def assign_costs(tasks):
+    """Attach an estimated 'cost' to every task, probing each source resolution only once."""
+    resolutions = {}
+    for task in tasks:
+        input_video = task['input_video']
+        if input_video not in resolutions:
+            resolutions[input_video] = probe_video_resolution(input_video)
+        task['cost'] = estimate_task_cost(task, resolutions[input_video])
+
+
+def schedule_tasks(work_items, max_workers, thread_budget=None):
+    """Order work items longest-first and split a global thread budget between concurrent ffmpeg processes.
+    
+    Dispatching the most expensive tasks first (LPT scheduling) keeps a long rally from being started
+    last and holding up the end of the batch. Every ffmpeg process gets the budget divided by the
+    number of processes that can actually run at once (max_workers, or fewer when there are fewer
+    work items) instead of its own pool sized to the core count.
+    """
+    if thread_budget is None:
+        thread_budget = os.cpu_count()
+    concurrent = max(1, min(max_workers, len(work_items)))
+    threads = max(1, thread_budget // concurrent)
+    
+    scheduled = sorted(work_items, key=lambda item: item.get('cost', 0.0), reverse=True)
+    for item in scheduled:
+        item['threads'] = threads
+    return scheduled, threads
+
+
+def load_match(video_dir):
+    """Read the view files and rallies of one match directory, or return None if it is incomplete."""
+    # Path to the csv file in this directory
+    csv_file = os.path.join(video_dir, LABELS_FILE)
+    
+    if not os.path.exists(csv_file):
+        logger.error(f"CSV file not found: {csv_file}")
+        return None
+    
+    video_files = sort_video_files(f for f in os.listdir(video_dir) if f.endswith('.mp4'))
+    
+    if not video_files:
+        logger.error(f"No video files found in directory: {video_dir}")
+        return None
+    
+    try:
+        rallies = read_rally_labels(csv_file)
+    except (OSError, RallyLabelError) as e:
+        logger.error(f"Error reading {csv_file}: {e}")
+        return None
+    
+    return {'video_files': video_files, 'rallies': rallies}
+
+
+def find_video_directories(base_dir, index_file=None):
+    """Find all directories containing mp4 files and rally_labels.csv.
+    
+    Returns {video_dir: {'video_files': [...], 'rallies': [...]}}. With an index_file, directory
+    listings and parsed labels are cached between runs and only changed directories are re-read.
+    """
+    matches = discover_matches(base_dir, read_rally_labels, index_file)
+    for match in matches.values():
+        # The index stores labels as plain JSON lists
+        match['rallies'] = [RallyLabel(*label) for label in match['rallies']]
+    return matches
+
+
+def virtual_clip_text(input_video, start_seconds, end_seconds):
+    """ffconcat descriptor playing input_video from start_seconds to end_seconds, without copying it."""
+    path = os.path.abspath(input_video).replace("'", "'\\''")
+    return (
+        "ffconcat version 1.0\n"
+        f"file '{path}'\n"
+        f"inpoint {start_seconds:.3f}\n"
+        f"outpoint {end_seconds:.3f}\n"
+    )
+
+
+def write_file_atomic(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_virtual_clips(video_dirs, output_dir, metrics=None):
+    """Write one ffconcat descriptor per rally and view, plus a <match>_clips.json index per match.
+    
+    Uses the same output layout as the cutting modes, with .ffconcat instead of .mp4 files. Nothing
+    is decoded or copied, so a whole season takes seconds. Returns (successful, failed).
+    """
+    start_time = time.time()
+    written = 0
+    failed = 0
+    
+    for video_dir in video_dirs:
+        video_name = os.path.basename(video_dir)
+        match = video_dirs[video_dir] if isinstance(video_dirs, dict) else load_match(video_dir)
+        if match is None:
+            continue
+        
+        # Merge into the existing index, watch mode only passes the rallies that changed
+        index_path = os.path.join(output_dir, f"{video_name}_clips.json")
+        index = {'match': os.path.abspath(video_dir), 'rallies': {}}
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, 'r') as f:
+                    index['rallies'] = json.load(f).get('rallies', {})
+            except (OSError, ValueError) as e:
+                logger.error(f"Rebuilding unreadable clip index {index_path}: {e}")
+        
+        for label in match['rallies']:
+            rally_num = label.rally_number
+            views = {}
+            for video_file in match['video_files']:
+                view = os.path.splitext(video_file)[0]
+                rally_dir = os.path.join(output_dir, f"rally{rally_num}", f"view{view}")
+                create_directory(rally_dir)
+                output_filename = f"{video_name}_{rally_num}_{label.start_frame}_{label.end_frame}_view{view}{VIRTUAL_CLIP_EXT}"
+                output_path = os.path.join(rally_dir, output_filename)
+                try:
+                    write_file_atomic(output_path, virtual_clip_text(os.path.join(video_dir, video_file),
+                                                                     timestamp_to_seconds(label.start_time),
+                                                                     timestamp_to_seconds(label.end_time)))
+                    views[view] = os.path.relpath(output_path, output_dir)
+                    written += 1
+                except OSError as e:
+                    logger.error(f"Error writing {output_path}: {e}")
+                    failed += 1
+            index['rallies'][str(rally_num)] = {
+                'start_time': label.start_time,
+                'end_time': label.end_time,
+                'start_frame': label.start_frame,
+                'end_frame': label.end_frame,
+                'views': views,
+            }
+        
+        index['rallies'] = dict(sorted(index['rallies'].items(), key=lambda item: int(item[0])))
+        try:
+            write_file_atomic(index_path, json.dumps(index, indent=2, ensure_ascii=False))
+        except OSError as e:
+            logger.error(f"Error writing {index_path}: {e}")
+    
+    if metrics is not None and metrics.enabled:
+        metrics.close(written, failed)
+    logger.info(f"Wrote {written} virtual clips in {time.time() - start_time:.2f}s ({failed} failed)")
+    return written, failed
+
+
+def process_videos_parallel(video_dirs, output_dir, max_workers=None, cache_file="processed_videos.db", cut_mode="reencode",
+                            fanout=False, fanout_batch=FANOUT_BATCH_SIZE, thread_budget=None, hash_sources=False,
+                            metrics=None, queue_dir=None, lease_timeout=QUEUE_LEASE_TIMEOUT, engine="asyncio",
+                            timeout_factor=TIMEOUT_FACTOR, scratch_dir=None, scratch_max_bytes=None, adaptive=False,
+                            min_workers=None, legacy_cache_file="processed_videos.json"):
     """Process videos in parallel from multiple directories according to rally labels."""
-    # Load the list of processed videos
-    processed_videos = laod_processed_videos(cache_file)
+    if cut_mode == 'virtual':
+        # Descriptors are written in-process in a fraction of a second, no journal or workers needed
+        return write_virtual_clips(video_dirs, output_dir, metrics)
+    
+    # Deferred so --help and label validation do not pay for sqlite3 / multiprocessing imports
+    from task_journal import TaskJournal, get_source_identity
+    
+    # Open the journal of processed tasks
+    journal = TaskJournal(cache_file)
+    logger.info(f"Loaded {len(journal)} finished tasks from {cache_file}")
+    if legacy_cache_file:
+        try:
+            imported = journal.import_legacy(legacy_cache_file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring legacy cache {legacy_cache_file}, its tasks will be cut again: {e}")
+        else:
+            if imported is not None:
+                logger.info(f"Imported {imported} finished tasks from legacy cache {legacy_cache_file}")
+    source_identities = {}
     
     # Create a list of all tasks
     all_tasks = []
@@ -115,35 +722,25 @@ def process_videos_parallel(video_dirs, output_dir, max_workers=None, cache_file
         dir_name = os.path.basename(video_dir)  
         video_name = f"{dir_name}"
         
-        # Path to the csv file in this directory
-        csv_file = os.path.join(video_dir, 'rally_labels.csv')
-        
-        if not os.path.exists(csv_file):
-            logger.error(f"CSV file not found: {csv_file}")
-            continue
-        
-        # Read the csv file 
-        df = pd.read_csv(csv_file)
-        
-        video_files = [f for f in os.listdir(video_dir) if f.endswith('.mp4')]
-        video_files.sort(key=lambda x:int(os.path.splitext(x)[0]) if os.path.splitext(x)[0].isdigit() else x )
-        
-        if not video_files:
-            logger.error(f"No video files found in directory: {video_dir}")
+        # Use the listing and labels cached by find_video_directories when available
+        match = video_dirs[video_dir] if isinstance(video_dirs, dict) else load_match(video_dir)
+        if match is None:
             continue
+        video_files = match['video_files']
+        rallies = match['rallies']
         
         logger.info(f"Found {len(video_files)} video files in {video_dir}")
-        logger.info(f"Found {len(df)} rallies in {csv_file}")
+        logger.info(f"Found {len(rallies)} rallies in {os.path.join(video_dir, LABELS_FILE)}")
         
         # Prepare tasks for this directory
-        for _, row in df.iterrows():
-            rally_num = row['Rally Number']
-            start_time = row['Start Time']
-            end_time = row['End Time']
+        for label in rallies:
+            rally_num = label.rally_number
+            start_time = label.start_time
+            end_time = label.end_time
             
             # Frame number
-            start_frame = row['Start Frame']
-            end_frame = row['End Frame']
+            start_frame = label.start_frame
+            end_frame = label.end_frame
             
             for video_file in video_files:
                 view = os.path.splitext(video_file)[0]
@@ -158,84 +755,794 @@ def process_videos_parallel(video_dirs, output_dir, max_workers=None, cache_file
                 output_filename = f"{video_name}_{rally_num}_{start_frame}_{end_frame}_view{view}.mp4"
                 output_path = os.path.join(rally_dir, output_filename)
                 
-                # Generate hash for this task
-                task_hash = get_video_hash(input_video, start_time, end_time)
+                # Generate hash for this task from the source identity and encode parameters
+                if input_video not in source_identities:
+                    source_identities[input_video] = get_source_identity(input_video, hash_sources)
+                task_hash = get_video_hash(source_identities[input_video], start_time, end_time, cut_mode)
                 
-                # Skip if already processed successfully
-                if task_hash in processed_videos:
+                # Skip if already processed successfully and the output is still intact
+                if journal.is_done(task_hash, output_path):
                     logger.info(f"Skipping already processed task: {task_hash}")
                     continue
+                # The JSON-cache cutter always re-encoded, so its outputs stand in for re-encode tasks
+                if cut_mode == 'reencode' and journal.adopt_legacy(get_legacy_video_hash(input_video, start_time, end_time),
+                                                                   task_hash, output_path):
+                    logger.info(f"Skipping task finished by the legacy cutter: {task_hash}")
+                    continue
                 
                 # Add task to the list
-                all_tasks.append((input_video, output_path, start_time, end_time, rally_num, view, task_hash))
-        if not all_tasks:
-            logger.info(f"No new videos to process.")
-            return 0,9
+                all_tasks.append({
+                    'input_video': input_video,
+                    'output_path': output_path,
+                    'start_time': start_time,
+                    'end_time': end_time,
+                    'start_frame': start_frame,
+                    'end_frame': end_frame,
+                    'rally_num': rally_num,
+                    'view': view,
+                    'task_hash': task_hash,
+                    'cut_mode': cut_mode,
+                })
+    if not all_tasks:
+        logger.info(f"No new videos to process.")
+        journal.close()
+        if metrics is not None and metrics.enabled:
+            metrics.close(0, 0)
+        return 0, 0
+    
+    # Encode into local scratch space and publish finished clips to output_dir in the background
+    publisher = None
+    if scratch_dir and queue_dir:
+        logger.warning("--scratch_dir only applies to local cutting, pass it to the queue workers instead")
+    elif scratch_dir:
+        from scratch_publish import OutputPublisher
+        publisher = OutputPublisher(scratch_dir, scratch_max_bytes)
+        for task in all_tasks:
+            publisher.stage(task)
+    
+    # Estimate each task's cost so the longest ones can be dispatched first
+    assign_costs(all_tasks)
+    
+    # In fan-out mode each work item cuts a batch of rallies from one source in a single ffmpeg pass
+    if fanout:
+        work_items = group_tasks_by_source(all_tasks, fanout_batch)
+    else:
+        work_items = all_tasks
+    
+    # Number of workers; never more than there are jobs, so the thread budget is not spread over idle slots
+    max_workers = min(max_workers or os.cpu_count(), len(work_items))
+    
+    work_items, threads = schedule_tasks(work_items, max_workers, thread_budget)
+    
+    if queue_dir:
+        logger.info(f"Publishing {len(all_tasks)} tasks ({len(work_items)} ffmpeg jobs, longest first) " +
+                    f"to the work queue in {queue_dir}, {threads} ffmpeg threads per job.")
+        tracker = RunTracker(journal, metrics, len(all_tasks))
+        run_with_queue(work_items, queue_dir, tracker, lease_timeout)
+    else:
+        logger.info(f"Start parallel processing ({engine}) with {max_workers} workers x {threads} ffmpeg threads " +
+                    f"for {len(all_tasks)} tasks ({len(work_items)} ffmpeg jobs, longest first).")
+        tracker = RunTracker(journal, metrics, len(all_tasks), publisher)
+        governor = None
+        if adaptive:
+            # Scale the number of running tasks with the host's CPU, memory and disk pressure
+            from concurrency_governor import create_governor
+            governor = create_governor(min_workers or max(1, max_workers // 4), max_workers)
+        try:
+            if engine == 'asyncio':
+                run_with_asyncio(work_items, max_workers, tracker, timeout_factor, governor=governor)
+            else:
+                run_with_process_pool(work_items, max_workers, tracker, governor)
+        except KeyboardInterrupt:
+            # Everything that finished is already in the journal, the next run resumes from there
+            logger.warning("Interrupted, stopped all running ffmpeg processes")
+            tracker.finish()
+            raise
+    
+    return tracker.finish()
+
+
+class RunTracker:
+    """Book-keeping shared by the execution engines: journal updates, telemetry and the progress log."""
+    
+    def __init__(self, journal, metrics, total_tasks, publisher=None):
+        self.journal = journal
+        self.metrics = metrics
+        self.total_tasks = total_tasks
+        self.publisher = publisher
+        self.successful = 0
+        self.failed = 0
+        self.scratch_paused = False
+        self.start_time = time.time()
+    
+    def task_done(self, results, task_metrics=None):
+        """Record the per-rally results of one finished work item."""
+        for success, output_path, task_hash in results:
+            if success and self.publisher is not None:
+                # Counted once the clip has been uploaded to the output tree
+                self.publisher.publish(output_path, task_hash)
+            elif success:
+                self.record_success(task_hash, output_path)
+            else:
+                self.failed += 1
+                if self.publisher is not None:
+                    self.publisher.discard(output_path)
+                print(f"Warning: Failed to cut video for task: {task_hash}")
         
-        # Number of workers
-        if max_workers is None:
-            max_workers = min(multiprocessing.cpu_count(), len(all_tasks))
+        if self.metrics is not None and task_metrics is not None:
+            self.metrics.record(task_metrics)
+        self.collect_published()
+        self.log_progress()
+    
+    def record_success(self, task_hash, output_path):
+        self.successful += 1
+        # Mark task as processed right away, so a crash later in the run does not forget it
+        try:
+            self.journal.record(task_hash, output_path)
+        except OSError as e:
+            logger.error(f"Error recording finished task {task_hash}: {e}")
+    
+    def collect_published(self, wait=False):
+        """Journal the clips whose upload from the scratch directory has finished."""
+        if self.publisher is None:
+            return
+        for task_hash, output_path, error in self.publisher.completed(wait):
+            if error is None:
+                self.record_success(task_hash, output_path)
+            else:
+                self.failed += 1
+                logger.error(f"Error publishing {output_path}: {error}")
+    
+    def scratch_full(self):
+        """True while new encodes should wait for uploads to free scratch space."""
+        if self.publisher is None:
+            return False
+        self.collect_published()
+        full = self.publisher.is_full()
+        if full != self.scratch_paused:
+            self.scratch_paused = full
+            logger.info("Scratch directory full, waiting for uploads before starting new tasks" if full else
+                        "Scratch space available again, resuming")
+        return full
+    
+    def task_error(self, item, error):
+        """Count every rally of a work item that raised instead of returning results."""
+        logger.error(f"Error processing task: {error}")
+        self.failed += len(item['segments']) if 'segments' in item else 1
+        if self.publisher is not None:
+            for segment in work_item_segments(item):
+                self.publisher.discard(segment['output_path'])
+        self.log_progress()
+    
+    def log_progress(self):
+        total_completed = self.successful + self.failed
+        progress = (total_completed / self.total_tasks) * 100
+        elapsed = time.time() - self.start_time
+        estimated_total = elapsed / (total_completed if total_completed >0 else 1) * self.total_tasks
+        remaining = estimated_total - elapsed
+        
+        logger.info(f"Progress: {progress:.1f}% ({total_completed}/{self.total_tasks}) - " +
+               f"Success: {self.successful}, Failed: {self.failed} - " +
+               f"Time remaining: {remaining/60:.1f} minutes")
+    
+    def finish(self):
+        """Close the journal, write the run report and log the summary; returns (successful, failed)."""
+        if self.publisher is not None:
+            self.collect_published(wait=True)
+            self.publisher.close()
+        self.journal.close()
         
-        # Execute tasks in parallel
-        successful = 0
-        failed = 0
-        start_time = time.time()
+        if self.metrics is not None and self.metrics.enabled:
+            summary = self.metrics.close(self.successful, self.failed)
+            logger.info(f"Run report: {summary['segment_seconds']:.1f}s of video in {summary['wall_time']:.1f}s " +
+                        f"(realtime factor {summary['realtime_factor'] or 0:.2f}), ffmpeg CPU {summary['cpu_time']:.1f}s, " +
+                        f"read {summary['input_bytes'] / 1e6:.1f} MB, wrote {summary['output_bytes'] / 1e6:.1f} MB")
         
-        logger.info(f"Start parallel processing with {max_workers} workers for {len(all_tasks)} tasks.")
+        # Summary 
+        elapsed = time.time() - self.start_time
+        logger.info(f"Processing completed in {elapsed/60:.2f} minutes")
+        logger.info(f"Successfully processed: {self.successful}/{self.total_tasks} videos")
+        logger.info(f"Failed: {self.failed}/{self.total_tasks} videos")
         
-        with ProcessPoolExecutor(max_workers=max_workers) as executor:
-            future_to_task = {executor.submit(process_video_task, task): task for task in all_tasks}
+        return self.successful, self.failed
+
+
+def concurrency_limit(governor, max_workers, running):
+    """Number of work items that may be in flight right now."""
+    return governor.limit(running) if governor is not None else max_workers
+
+
+def run_with_process_pool(work_items, max_workers, tracker, governor=None):
+    """Run work items on a local process pool, keeping at most max_workers of them (or as many as the
+    governor allows) in flight."""
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+    
+    for item in work_items:
+        item['submitted_at'] = time.time()
+    
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        future_to_task = {}
+        next_item = 0
+        while future_to_task or next_item < len(work_items):
+            # Items are submitted one at a time, so submission can pause while the scratch directory is full
+            while (next_item < len(work_items)
+                   and len(future_to_task) < concurrency_limit(governor, max_workers, len(future_to_task))
+                   and not tracker.scratch_full()):
+                item = work_items[next_item]
+                next_item += 1
+                future_to_task[executor.submit(run_work_item, item)] = item
+            if not future_to_task:
+                time.sleep(0.5)
+                continue
             
             # Process each future as it completes
-            for future in as_completed(future_to_task): # A function that yields futures as they complete (finish processing) *Yields in the order thay complete*
+            done, _ = wait(future_to_task, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = future_to_task.pop(future)
                 try:
-                    success, output_path, task_hash = future.result()
+                    results, task_metrics = future.result()
+                except Exception as e:
+                    tracker.task_error(item, e)
+                    continue
+                tracker.task_done(results, task_metrics)
+
+
+
+def task_timeout(item, timeout_factor=TIMEOUT_FACTOR):
+    """Seconds a work item may run before its ffmpeg processes are killed.
+    
+    Scaled with the source it decodes: a fan-out batch reads everything from its first rally's start
+    to its last rally's end, however short the rallies are.
+    """
+    segments = work_item_segments(item)
+    return TIMEOUT_MIN_SECONDS + timeout_factor * max(segments_duration(segments), segments_span(segments))
+
+
+def remove_partial_outputs(segments):
+    """Delete the (possibly half-written) outputs of segments that did not finish."""
+    for segment in segments:
+        try:
+            os.remove(segment['output_path'])
+            logger.info(f"Removed partial output {segment['output_path']}")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Could not remove partial output {segment['output_path']}: {e}")
+
+
+class StreamProgress:
+    """Seconds of video encoded so far, updated live from ffmpeg's -progress output."""
+    
+    def __init__(self, total_seconds):
+        self.total_seconds = total_seconds
+        self.finished_seconds = 0.0
+        self.running = {}  # id(item) -> seconds encoded so far by the running ffmpeg
+        self.start_time = time.time()
+    
+    def update(self, item, seconds):
+        self.running[id(item)] = seconds
+    
+    def finish(self, item, seconds):
+        self.running.pop(id(item), None)
+        self.finished_seconds += seconds
+    
+    def log(self):
+        done = self.finished_seconds + sum(self.running.values())
+        elapsed = time.time() - self.start_time
+        speed = done / elapsed if elapsed > 0 else 0
+        remaining = (self.total_seconds - done) / speed if speed > 0 else 0
+        logger.info(f"Encoding: {done / max(self.total_seconds, 1e-9) * 100:.1f}% " +
+                    f"({done:.0f}/{self.total_seconds:.0f}s of video, {len(self.running)} running, {speed:.1f}x realtime) - " +
+                    f"Time remaining: {remaining/60:.1f} minutes")
+
+
+async def run_ffmpeg_async(cmd, on_progress=None, child_stats=None):
+    """Run an ffmpeg/ffprobe command as an asyncio child process and return its stdout.
+    
+    ffmpeg commands get -progress pipe:1, and on_progress(seconds) is called with the output position
+    of every progress report. CPU time and I/O of the child are sampled from /proc at each report
+    and added to child_stats. If the calling task is cancelled (timeout, Ctrl-C) the child is killed.
+    Raises CalledProcessError on a non-zero exit status.
+    """
+    import asyncio
+    
+    is_ffmpeg = cmd[0] == 'ffmpeg'
+    if is_ffmpeg:
+        cmd = ['ffmpeg', '-nostats', '-progress', 'pipe:1', *cmd[1:]]
+    proc = await asyncio.create_subprocess_exec(*cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    sample = {}
+    
+    async def read_stdout():
+        if not is_ffmpeg:
+            return await proc.stdout.read()
+        while True:
+            line = await proc.stdout.readline()
+            if not line:
+                return b''
+            key, _, value = line.decode(errors='replace').strip().partition('=')
+            # out_time_ms is in microseconds as well (a long-standing ffmpeg quirk)
+            if key in ('out_time_us', 'out_time_ms') and value.isdigit() and on_progress is not None:
+                on_progress(int(value) / 1e6)
+            elif key == 'progress':
+                # End of a progress report, emitted every 0.5 s and once more right before exiting
+                sample.update(read_process_stats(proc.pid))
+    
+    try:
+        stdout, stderr, _ = await asyncio.gather(read_stdout(), proc.stderr.read(), proc.wait())
+    except BaseException:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    finally:
+        if child_stats is not None:
+            for key, value in sample.items():
+                child_stats[key] = child_stats.get(key, 0) + value
+    
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stdout, stderr)
+    return stdout.decode(errors='replace')
+
+
+async def cut_work_item_async(item, on_progress, child_stats):
+    """Cut every segment of a work item with asyncio-managed ffmpeg processes."""
+    segments = work_item_segments(item)
+    threads = item.get('threads')
+    
+    if 'segments' in item:
+        await run_ffmpeg_async(fanout_command(item['input_video'], segments, threads), on_progress, child_stats)
+        return
+    
+    task = item
+    start_seconds = timestamp_to_seconds(task['start_time'])
+    end_seconds = timestamp_to_seconds(task['end_time'])
+    if task['cut_mode'] == 'reencode':
+        cmd = segment_command(task['input_video'], task['output_path'], start_seconds, end_seconds, REENCODE_ARGS,
+                              task['end_frame'] - task['start_frame'], threads)
+        await run_ffmpeg_async(cmd, on_progress, child_stats)
+    elif task['cut_mode'] == 'copy':
+        cmd = segment_command(task['input_video'], task['output_path'], start_seconds, end_seconds, COPY_ARGS,
+                              threads=threads)
+        await run_ffmpeg_async(cmd, on_progress, child_stats)
+    elif task['cut_mode'] == 'smart':
+        frame_count = task['end_frame'] - task['start_frame']
+        output_dir = os.path.dirname(task['output_path']) or '.'
+        with tempfile.TemporaryDirectory(dir=output_dir, prefix='.smartcut_') as tmp_dir:
+            try:
+                video, audio = parse_stream_probe(await run_ffmpeg_async(stream_probe_command(task['input_video'])))
+                offset = stream_start_time(video)
+                probe_output = await run_ffmpeg_async(keyframe_probe_command(task['input_video'], start_seconds,
+                                                                             end_seconds, offset))
+                keyframe = parse_next_keyframe(probe_output, start_seconds, end_seconds, offset)
+                head_args = head_encode_args(video, audio)
+                if head_args is None:
+                    logger.info(f"Cannot match the codec parameters of {task['input_video']}, re-encoding the whole rally")
+                for cmd in smart_cut_commands(task['input_video'], task['output_path'], start_seconds, end_seconds,
+                                              keyframe, head_args, tmp_dir, frame_count, threads):
+                    await run_ffmpeg_async(cmd, None, child_stats)
+                check_smart_cut(await run_ffmpeg_async(clip_probe_command(task['output_path'])),
+                                end_seconds - start_seconds, frame_count)
+            except (subprocess.CalledProcessError, ValueError) as e:
+                logger.warning(f"Smart cut failed for {task['input_video']}, falling back to re-encode: {e}")
+                cmd = segment_command(task['input_video'], task['output_path'], start_seconds, end_seconds,
+                                      REENCODE_ARGS, frame_count, threads)
+                await run_ffmpeg_async(cmd, on_progress, child_stats)
+    else:
+        raise ValueError(f"Unknown cut mode: {task['cut_mode']}")
+
+
+async def run_work_item_async(item, progress, timeout_factor=TIMEOUT_FACTOR):
+    """Asyncio counterpart of run_work_item: cut one work item.
+    
+    Never raises except for cancellation; failures and timeouts are reported in the results.
+    """
+    import asyncio
+    
+    segments = work_item_segments(item)
+    description = (f"{len(segments)} rallies from {item['input_video']}" if 'segments' in item else
+                   f"Rally {item['rally_num']}, View {item['view']}: {item['start_time']} to {item['end_time']}")
+    logger.info(f"Processing {description}")
+    
+    probe = TaskProbe(item.get('submitted_at'))
+    child_stats = {}
+    timeout = task_timeout(item, timeout_factor)
+    try:
+        await asyncio.wait_for(cut_work_item_async(item, lambda seconds: progress.update(item, seconds), child_stats),
+                               timeout)
+        logger.info(f"Successfully cut {description}")
+        success = True
+    except asyncio.TimeoutError:
+        logger.error(f"Timed out after {timeout:.0f}s cutting {description}")
+        remove_partial_outputs(segments)
+        success = False
+    except asyncio.CancelledError:
+        remove_partial_outputs(segments)
+        raise
+    except Exception as e:
+        logger.error(f"Error cutting {description}: {e}")
+        remove_partial_outputs(segments)
+        success = False
+    finally:
+        progress.finish(item, segments_duration(segments))
+    
+    results = [(success, segment['output_path'], segment['task_hash']) for segment in segments]
+    return results, work_item_metrics(item, segments, results, probe, child_stats)
+
+
+def run_with_asyncio(work_items, max_workers, tracker, timeout_factor=TIMEOUT_FACTOR, progress_interval=10,
+                     governor=None):
+    """Run work items as ffmpeg children of a single asyncio event loop, at most max_workers at a time
+    (or as many as the governor allows).
+    
+    Unlike the process pool there is no Python worker per slot: ffmpeg processes are started directly,
+    killed when they exceed their timeout, and on Ctrl-C every running ffmpeg is killed and its
+    partial outputs removed before KeyboardInterrupt is re-raised.
+    """
+    import asyncio
+    import signal
+    
+    async def run_all():
+        # Ctrl-C cancels the whole run, which kills the running ffmpeg children via cancellation
+        main_task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGINT, main_task.cancel)
+        
+        progress = StreamProgress(sum(segments_duration(work_item_segments(item)) for item in work_items))
+        
+        async def report_progress():
+            while True:
+                await asyncio.sleep(progress_interval)
+                progress.log()
+        
+        for item in work_items:
+            item['submitted_at'] = time.time()
+        reporter = asyncio.create_task(report_progress())
+        running = set()
+        next_item = 0
+        try:
+            while running or next_item < len(work_items):
+                # Items start in schedule order (longest first) whenever a slot is free
+                while (next_item < len(work_items) and len(running) < concurrency_limit(governor, max_workers, len(running))
+                       and not tracker.scratch_full()):
+                    running.add(asyncio.create_task(run_work_item_async(work_items[next_item], progress, timeout_factor)))
+                    next_item += 1
+                if not running:
+                    await asyncio.sleep(0.5)
+                    continue
+                done, running = await asyncio.wait(running, timeout=0.5, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    results, task_metrics = task.result()
+                    tracker.task_done(results, task_metrics)
+        except asyncio.CancelledError:
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+            raise KeyboardInterrupt
+        finally:
+            reporter.cancel()
+            loop.remove_signal_handler(signal.SIGINT)
+    
+    asyncio.run(run_all())
+
+
+def run_with_queue(work_items, queue_dir, tracker, lease_timeout=QUEUE_LEASE_TIMEOUT, poll_interval=5):
+    """Coordinate a multi-host run: publish work items to a shared queue and collect the workers' results.
+    
+    Workers are started separately on any host that mounts the queue, sources and output directory
+    under the same paths (`python video_cutting.py worker --queue <dir>`). The coordinator reclaims
+    leases of dead workers, records finished tasks in the journal and logs cluster-wide progress.
+    """
+    from work_queue import WorkQueue
+    
+    queue = WorkQueue(queue_dir, lease_timeout)
+    for item in work_items:
+        item['submitted_at'] = time.time()
+    task_ids = set(queue.publish(work_items))
+    last_status = 0
+    
+    while task_ids:
+        queue.reclaim_stale()
+        
+        for result in queue.collect('done', task_ids):
+            task_ids.discard(result['task_id'])
+            tracker.task_done(result['results'], result.get('metrics'))
+        
+        for task in queue.collect('failed', task_ids):
+            task_ids.discard(task['task_id'])
+            tracker.task_error(task['item'], task.get('last_error'))
+        
+        if task_ids and time.time() - last_status >= 60:
+            status = queue.status()
+            workers = ', '.join(f"{worker} ({count})" for worker, count in sorted(status['workers'].items()))
+            logger.info(f"Queue: {status['pending']} pending, {status['leased']} running - " +
+                        f"workers: {workers or 'none'}")
+            last_status = time.time()
+        
+        if task_ids:
+            time.sleep(poll_interval)
+    
+    queue.mark_finished()
+
+
+def worker_main(argv=None):
+    """Entry point of `video_cutting.py worker`: claim and run tasks from a shared work queue."""
+    import threading
+    from work_queue import WorkQueue, default_worker_id
+    
+    parser = argparse.ArgumentParser(prog="video_cutting.py worker",
+                                     description="Run cutting tasks from a shared work queue.")
+    parser.add_argument("--queue", required=True, help="Queue directory on shared storage")
+    parser.add_argument("--worker_id", default=default_worker_id(), help="Worker name (default: <hostname>-<pid>)")
+    parser.add_argument("--lease_timeout", type=float, default=QUEUE_LEASE_TIMEOUT,
+                        help=f"Seconds without heartbeat after which a lease is reclaimed (default: {QUEUE_LEASE_TIMEOUT})")
+    parser.add_argument("--poll_interval", type=float, default=5, help="Seconds between polls of an empty queue")
+    parser.add_argument("--exit_when_done", action="store_true",
+                        help="Exit once the coordinator has marked the queue finished instead of waiting for new tasks")
+    parser.add_argument("--scratch_dir", default=None,
+                        help="Encode into this local directory and copy finished clips to the output tree atomically")
+    args = parser.parse_args(argv)
+    
+    publisher = None
+    if args.scratch_dir:
+        from scratch_publish import OutputPublisher
+        publisher = OutputPublisher(args.scratch_dir)
+    
+    queue = WorkQueue(args.queue, args.lease_timeout)
+    logger.info(f"Worker {args.worker_id} polling {args.queue}")
+    completed = 0
+    
+    while True:
+        queue.reclaim_stale()
+        claimed = queue.claim(args.worker_id)
+        if claimed is None:
+            if args.exit_when_done and queue.is_finished():
+                break
+            time.sleep(args.poll_interval)
+            continue
+        
+        lease_path, task = claimed
+        logger.info(f"Worker {args.worker_id} claimed {task['task_id']} (attempt {task['attempts'] + 1})")
+        
+        # Keep the lease alive while ffmpeg runs
+        stop = threading.Event()
+        def heartbeat():
+            while not stop.wait(args.lease_timeout / 3):
+                if not queue.heartbeat(lease_path):
+                    logger.warning(f"Lost the lease on {task['task_id']}")
+                    return
+        heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+        heartbeat_thread.start()
+        
+        try:
+            item = task['item']
+            if publisher is not None:
+                # Stage a copy, the task itself must keep its final paths in case it is retried elsewhere
+                item = dict(item, segments=[dict(s) for s in item['segments']]) if 'segments' in item else dict(item)
+                for segment in work_item_segments(item):
+                    publisher.stage(segment)
+            results, task_metrics = run_work_item(item)
+            if publisher is not None:
+                # Published synchronously, while the heartbeat still holds the lease
+                staged, results = results, []
+                for success, output_path, task_hash in staged:
+                    final_path = publisher.final_path(output_path)
                     if success:
-                        successful += 1
-                        # Mark task as processed -> Each video has one task hash , put the task hash in the processed_videos dictionary and save as json file. (Inorder to check if the video is already processed)
-                        processed_videos[task_hash] = output_path
+                        publisher.publish(output_path)
                     else:
-                        failed += 1
-                        print(f"Warning: Failed to cut video for task: {task_hash}")
-                        
-                    # Log process
-                    total_completed = successful + failed
-                    progress = (total_completed / len(all_tasks)) * 100
-                    elapsed = time.time() - start_time
-                    estimated_total = elapsed / (total_completed if total_completed >0 else 1) * len(all_tasks)
-                    remaining = estimated_total - elapsed
-                    
-                    logger.info(f"Progress: {progress:.1f}% ({total_completed}/{len(all_tasks)}) - " +
-                           f"Success: {successful}, Failed: {failed} - " +
-                           f"Time remaining: {remaining/60:.1f} minutes")
-                except Exception as e:
-                    logger.error(f"Error processing task: {e}")
-                    failed += 1
-                    
-    # Final save of processed videos
-    save_processed_videos(processed_videos, cache_file)
+                        publisher.discard(output_path)
+                    results.append((success, final_path, task_hash))
+                for _, output_path, error in publisher.completed(wait=True):
+                    if error is not None:
+                        logger.error(f"Error publishing {output_path}: {error}")
+                        results = [(False, path, task_hash) for _, path, task_hash in results]
+        except Exception as e:
+            results, task_metrics = None, None
+            error = e
+        finally:
+            stop.set()
+            heartbeat_thread.join()
+        
+        if results is not None and all(success for success, _, _ in results):
+            task_metrics['worker_id'] = args.worker_id
+            queue.complete(lease_path, task, {'results': results, 'metrics': task_metrics})
+            completed += 1
+        else:
+            if results is not None:
+                error = "ffmpeg failed"
+            state = queue.retry_or_fail(lease_path, task, error)
+            logger.error(f"Task {task['task_id']} failed on {args.worker_id}: {error} -> {state}")
+    
+    logger.info(f"Worker {args.worker_id} finished after {completed} tasks")
+
+
+def match_files_snapshot(video_dir):
+    """(size, mtime_ns) of the label file and every view in a directory, or None if it cannot be listed."""
+    snapshot = {}
+    try:
+        with os.scandir(video_dir) as it:
+            for entry in it:
+                if entry.name == LABELS_FILE or entry.name.endswith('.mp4'):
+                    stat = entry.stat()
+                    snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        return None
+    return snapshot
+
+
+def changed_rallies(video_dir, match, files, known):
+    """Return the rallies of a match that need cutting, given what was cut from it before.
+    
+    A new or rewritten view needs every rally; otherwise only rallies that were added or whose
+    frames changed since the previous label set are queued.
+    """
+    if known is None:
+        return match['rallies']
     
-    # Summary 
-    elapsed = time.time() - start_time
-    logger.info(f"Processing completed in {elapsed/60:.2f} minutes")
-    logger.info(f"Successfully processed: {successful}/{len(all_tasks)} videos")
-    logger.info(f"Failed: {failed}/{len(all_tasks)} videos")
+    old_views = {name: value for name, value in known['files'].items() if name.endswith('.mp4')}
+    new_views = {name: value for name, value in files.items() if name.endswith('.mp4')}
+    if any(old_views.get(name) != value for name, value in new_views.items()):
+        return match['rallies']
     
-    return successful, failed       
+    removed = known['rallies'] - set(match['rallies'])
+    if removed:
+        logger.info(f"{len(removed)} rallies changed or were removed in {video_dir}, existing clips are kept")
+    return [label for label in match['rallies'] if label not in known['rallies']]
+
+
+def watch_directories(base_dir, output_dir, index_file=None, poll_interval=WATCH_POLL_INTERVAL,
+                      debounce=WATCH_DEBOUNCE, force_polling=False, make_metrics=None, **cut_options):
+    """Daemon mode: cut new or changed rallies as match directories appear or are updated under base_dir.
+    
+    Changes are picked up with inotify where available (polling otherwise). A changed directory is
+    only cut once its label file and views have stopped changing for `debounce` seconds, so videos
+    still being copied are not cut half-written. Each batch goes through process_videos_parallel and
+    so through the same journal, scheduler and engine as a one-shot run.
+    """
+    from fs_watch import RESCAN_ALL, create_watcher
+    
+    # Start watching before the initial scan, so nothing written during the scan is missed
+    watcher = create_watcher(base_dir, poll_interval, force_polling)
+    known = {}    # video_dir -> {'files': snapshot, 'rallies': set of labels} as last cut
+    pending = {}  # video_dir -> (time of the last change seen, snapshot at that time)
+    changed = RESCAN_ALL
+    
+    try:
+        while True:
+            now = time.time()
+            if changed is RESCAN_ALL:
+                # Full rescan through the discovery index: at startup, on every poll and after an inotify overflow
+                changed = [video_dir for video_dir in find_video_directories(base_dir, index_file)
+                           if video_dir not in known or match_files_snapshot(video_dir) != known[video_dir]['files']]
+            for video_dir in changed:
+                files = match_files_snapshot(video_dir)
+                if video_dir not in pending or pending[video_dir][1] != files:
+                    pending[video_dir] = (now, files)
+            
+            # Directories whose files have not changed for `debounce` seconds are ready to cut
+            batch = {}
+            for video_dir, (since, snapshot) in list(pending.items()):
+                if now - since < debounce:
+                    continue
+                files = match_files_snapshot(video_dir)
+                if files != snapshot:
+                    pending[video_dir] = (now, files)  # Still being written
+                    continue
+                del pending[video_dir]
+                if not files or LABELS_FILE not in files or len(files) < 2:
+                    known.pop(video_dir, None)  # Not a (complete) match directory yet
+                    continue
+                
+                match = load_match(video_dir)
+                if match is None:
+                    continue
+                rallies = changed_rallies(video_dir, match, files, known.get(video_dir))
+                known[video_dir] = {'files': files, 'rallies': set(match['rallies'])}
+                if rallies:
+                    batch[video_dir] = {'video_files': match['video_files'], 'rallies': rallies}
+            
+            if batch:
+                logger.info(f"Cutting {sum(len(m['rallies']) for m in batch.values())} new or changed rallies "
+                            f"from {len(batch)} directories")
+                create_directory(output_dir)
+                try:
+                    process_videos_parallel(batch, output_dir,
+                                            metrics=make_metrics() if make_metrics else None, **cut_options)
+                except Exception as e:
+                    # Keep the daemon alive; failed tasks are not journaled and are retried on the next change
+                    logger.error(f"Error processing {', '.join(batch)}: {e}")
+            
+            changed = watcher.wait(1 if pending else poll_interval)
+    finally:
+        watcher.close()
+
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'worker':
+        return worker_main(sys.argv[2:])
+    
     parser = argparse.ArgumentParser(description="Cut videos based on rally labels.")
     parser.add_argument("--base_dir", required=True, help="Base directory containing source video directories")
     parser.add_argument("--output_dir", required=True, help="Directory to save output videos")
     parser.add_argument("--workers", type=int, default=16, 
                         help="Maximum number of worker processes (default: number of CPU cores)")
-    parser.add_argument("--cache_file", default="processed_videos.json",
-                        help="File to store information about processed videos")
+    parser.add_argument("--cache_file", default="processed_videos.db",
+                        help="SQLite journal of finished tasks, updated as each task completes")
+    parser.add_argument("--legacy_cache_file", default="processed_videos.json",
+                        help="processed_videos.json of earlier versions, imported into the journal once "
+                             "(empty string to skip)")
+    parser.add_argument("--hash_sources", action="store_true",
+                        help="Also fingerprint the first and last MiB of each source when keying finished tasks")
+    parser.add_argument("--cut_mode", "--cut-mode", choices=CUT_MODES, default="reencode",
+                        help="reencode: full libx264 re-encode, copy: stream copy (keyframe-aligned start), "
+                             "smart: re-encode only up to the first keyframe and stream-copy the rest, "
+                             "virtual: write ffconcat descriptors pointing into the sources instead of video (default: reencode)")
+    parser.add_argument("--fanout", action="store_true",
+                        help="Cut all rallies of a source video from a single decode (re-encode mode only)")
+    parser.add_argument("--fanout_batch", type=int, default=FANOUT_BATCH_SIZE,
+                        help=f"Maximum rallies per ffmpeg process in fan-out mode (default: {FANOUT_BATCH_SIZE})")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Total thread budget shared by all concurrent ffmpeg processes (default: number of CPU cores)")
+    parser.add_argument("--metrics_file", default=None,
+                        help="Append per-task metrics and a run summary to this file as JSON lines")
+    parser.add_argument("--prometheus_file", default=None,
+                        help="Write the run summary to this Prometheus textfile-collector file (*.prom)")
+    parser.add_argument("--index_file", default="discovery_index.json",
+                        help="File caching directory listings and parsed labels between runs (empty string disables it)")
+    parser.add_argument("--queue", default=None,
+                        help="Publish tasks to this shared queue directory and coordinate `video_cutting.py worker` "
+                             "processes on other hosts instead of cutting locally")
+    parser.add_argument("--lease_timeout", type=float, default=QUEUE_LEASE_TIMEOUT,
+                        help=f"Seconds without heartbeat before a queue worker's task is reclaimed (default: {QUEUE_LEASE_TIMEOUT})")
+    parser.add_argument("--engine", choices=ENGINES, default="asyncio",
+                        help="asyncio: run ffmpeg children directly from one event loop with per-task timeouts and live "
+                             "progress, process: one Python worker process per slot (default: asyncio)")
+    parser.add_argument("--timeout_factor", type=float, default=TIMEOUT_FACTOR,
+                        help=f"asyncio engine: kill a task after {TIMEOUT_MIN_SECONDS}s + this many times its segment "
+                             f"length (default: {TIMEOUT_FACTOR})")
+    parser.add_argument("--scratch_dir", default=None,
+                        help="Encode into this local directory and copy finished clips to --output_dir in the background, "
+                             "renaming them into place atomically (for output directories on network storage)")
+    parser.add_argument("--scratch_max_gb", type=float, default=SCRATCH_MAX_GB,
+                        help=f"Pause new tasks while the scratch directory holds this many GB (default: {SCRATCH_MAX_GB})")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Scale the number of concurrent tasks between --min_workers and --workers with the "
+                             "host's load, available memory and disk I/O wait")
+    parser.add_argument("--min_workers", type=int, default=None,
+                        help="Adaptive mode: lowest (and starting) number of concurrent tasks (default: a quarter of --workers)")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running and cut new or changed rallies as matches are added or relabeled under --base_dir")
+    parser.add_argument("--watch_polling", action="store_true",
+                        help="Watch mode: poll instead of using inotify (needed when other hosts write to --base_dir over NFS/SMB)")
+    parser.add_argument("--poll_interval", type=float, default=WATCH_POLL_INTERVAL,
+                        help=f"Watch mode: seconds between rescans when polling (default: {WATCH_POLL_INTERVAL})")
+    parser.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE,
+                        help=f"Watch mode: seconds a changed directory must stay unchanged before it is cut (default: {WATCH_DEBOUNCE})")
     
     args = parser.parse_args()
     
+    if args.fanout and args.cut_mode != 'reencode':
+        # copy/smart already avoid decoding the source, a shared decode would only slow them down
+        logger.warning(f"--fanout only applies to re-encode mode, cutting rallies one by one in {args.cut_mode} mode")
+        args.fanout = False
+    
+    scratch_max_bytes = int(args.scratch_max_gb * 1024 ** 3)
+    
+    if args.watch:
+        try:
+            watch_directories(args.base_dir, args.output_dir, args.index_file, args.poll_interval, args.debounce,
+                              args.watch_polling, lambda: MetricsRecorder(args.metrics_file, args.prometheus_file),
+                              max_workers=args.workers, cache_file=args.cache_file, cut_mode=args.cut_mode,
+                              fanout=args.fanout, fanout_batch=args.fanout_batch, thread_budget=args.threads,
+                              hash_sources=args.hash_sources, queue_dir=args.queue, lease_timeout=args.lease_timeout,
+                              engine=args.engine, timeout_factor=args.timeout_factor, scratch_dir=args.scratch_dir,
+                              scratch_max_bytes=scratch_max_bytes, adaptive=args.adaptive, min_workers=args.min_workers,
+                              legacy_cache_file=args.legacy_cache_file)
+        except KeyboardInterrupt:
+            sys.exit(130)
+        return
+    
     # Find all directories with videos and rally_labels.csv
-    video_dirs = find_video_directories(args.base_dir)
+    video_dirs = find_video_directories(args.base_dir, args.index_file)
     
     if not video_dirs:
         logger.error("No video directories found.")
@@ -249,7 +1556,14 @@ def main():
     create_directory(args.output_dir)
     
     # Process videos in parallel
-    process_videos_parallel(video_dirs, args.output_dir, args.workers, args.cache_file)
+    try:
+        process_videos_parallel(video_dirs, args.output_dir, args.workers, args.cache_file, args.cut_mode,
+                                args.fanout, args.fanout_batch, args.threads, args.hash_sources,
+                                MetricsRecorder(args.metrics_file, args.prometheus_file), args.queue, args.lease_timeout,
+                                args.engine, args.timeout_factor, args.scratch_dir, scratch_max_bytes, args.adaptive,
+                                args.min_workers, args.legacy_cache_file)
+    except KeyboardInterrupt:
+        sys.exit(130)
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
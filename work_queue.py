@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import socket
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+QUEUE_STATES = ('pending', 'leased', 'done', 'failed', 'tmp')
+
+# Written by the coordinator once every published task has finished
+FINISHED_MARKER = 'FINISHED'
+
+# Id of the coordinator run whose tasks are current, written by publish()
+RUN_FILE = 'RUN'
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """Task queue in a directory on shared storage, using lease files and atomic renames.
+
+    Layout of queue_dir:
+        pending/<task_id>.json             tasks waiting for a worker
+        leased/<task_id>.json@<worker_id>  tasks claimed by a worker; the file's ctime is its heartbeat
+        done/<task_id>.json                results written by workers, collected by the coordinator
+        failed/<task_id>.json              tasks that failed max_attempts times
+        tmp/                               staging area, files are renamed into place when complete
+
+    rename() within one filesystem is atomic (including on NFS), so of several workers renaming the
+    same pending file only one succeeds and owns the lease. A worker refreshes its lease by touching
+    the lease file; leases not refreshed for lease_timeout seconds belong to dead workers and are put
+    back into pending/ by whichever process notices first. Lease ages come from the file server's
+    clock and are compared to the local clock, so hosts need roughly synchronized clocks (NTP).
+
+    Task ids start with the id of the coordinator run that published them. Publishing starts a new
+    run: tasks still pending from an earlier (aborted) run are removed, and leases of earlier runs
+    that expire or fail are dropped instead of being retried, since the new run publishes whatever
+    is still unfinished.
+    """
+
+    def __init__(self, queue_dir, lease_timeout=120, max_attempts=3):
+        self.queue_dir = queue_dir
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.ignored = set()  # Results of other runs already reported by collect()
+        for state in QUEUE_STATES:
+            os.makedirs(os.path.join(queue_dir, state), exist_ok=True)
+
+    def _path(self, state, name=''):
+        return os.path.join(self.queue_dir, state, name)
+
+    def _write(self, state, name, payload):
+        """Write a JSON file into state/ atomically (write to tmp/, then rename)."""
+        tmp_path = self._path('tmp', f"{name}.{default_worker_id()}.{time.time_ns()}")
+        with open(tmp_path, 'w') as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, self._path(state, name))
+
+    def _read(self, path):
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def publish(self, items):
+        """Start a new run with the given work items, in order; returns their task ids."""
+        finished_marker = os.path.join(self.queue_dir, FINISHED_MARKER)
+        if os.path.exists(finished_marker):
+            os.remove(finished_marker)
+        # Task ids sort in publish order, so workers claim the most expensive (first scheduled) tasks first
+        run_id = f"{time.strftime('%Y%m%d%H%M%S')}{time.time_ns() // 1000 % 1000000:06d}"
+        self._write('', RUN_FILE, run_id)
+        
+        # Whatever is still pending belongs to an earlier run
+        stale = 0
+        for name in os.listdir(self._path('pending')):
+            if name.endswith('.json'):
+                try:
+                    os.remove(self._path('pending', name))
+                    stale += 1
+                except FileNotFoundError:
+                    pass  # Claimed by a worker in the meantime
+        if stale:
+            logger.warning(f"Removed {stale} pending tasks of an earlier run, their rallies are published again")
+        
+        task_ids = []
+        for i, item in enumerate(items):
+            task_id = f"{run_id}-{i:06d}"
+            self._write('pending', f"{task_id}.json", {'task_id': task_id, 'attempts': 0, 'item': item})
+            task_ids.append(task_id)
+        return task_ids
+
+    def current_run(self):
+        """Id of the run last published, or None if nothing was published yet."""
+        try:
+            return self._read(os.path.join(self.queue_dir, RUN_FILE))
+        except (OSError, ValueError):
+            return None
+
+    def is_current(self, task_id):
+        """Whether a task id (or a file named after it) belongs to the current run."""
+        run_id = self.current_run()
+        return run_id is None or task_id.startswith(f"{run_id}-")
+
+    def mark_finished(self):
+        with open(os.path.join(self.queue_dir, FINISHED_MARKER), 'w') as f:
+            f.write(f"{time.time()}\n")
+
+    def is_finished(self):
+        return os.path.exists(os.path.join(self.queue_dir, FINISHED_MARKER))
+
+    def claim(self, worker_id):
+        """Lease the next pending task; returns (lease_path, task) or None if nothing is pending."""
+        for name in sorted(os.listdir(self._path('pending'))):
+            if not name.endswith('.json'):
+                continue
+            lease_path = self._path('leased', f"{name}@{worker_id}")
+            try:
+                os.rename(self._path('pending', name), lease_path)
+            except FileNotFoundError:
+                continue  # Another worker was faster
+            # rename() keeps the publish time as mtime; start the lease clock now
+            os.utime(lease_path)
+            try:
+                return lease_path, self._read(lease_path)
+            except (OSError, ValueError) as e:
+                logger.error(f"Dropping unreadable task {name}: {e}")
+                os.replace(lease_path, self._path('failed', name))
+        return None
+
+    def heartbeat(self, lease_path):
+        """Refresh a lease; returns False if the lease was reclaimed in the meantime."""
+        try:
+            os.utime(lease_path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def complete(self, lease_path, task, result):
+        """Publish a task's result and release its lease."""
+        self._write('done', f"{task['task_id']}.json", {'task_id': task['task_id'], **result})
+        try:
+            os.remove(lease_path)
+        except FileNotFoundError:
+            logger.warning(f"Lease of {task['task_id']} was reclaimed before it completed")
+
+    def retry_or_fail(self, lease_path, task, error):
+        """Put a failed task back into pending/, or into failed/ after max_attempts attempts.
+
+        Tasks of an earlier run are dropped instead; returns the new state ('dropped' for those).
+        """
+        task = dict(task, attempts=task.get('attempts', 0) + 1, last_error=str(error))
+        if not self.is_current(task['task_id']):
+            state = 'dropped'
+        else:
+            state = 'pending' if task['attempts'] < self.max_attempts else 'failed'
+            self._write(state, f"{task['task_id']}.json", task)
+        try:
+            os.remove(lease_path)
+        except FileNotFoundError:
+            pass
+        return state
+
+    def reclaim_stale(self):
+        """Return tasks whose lease has not been refreshed for lease_timeout seconds to the queue."""
+        reclaimed = 0
+        now = time.time()
+        for name in os.listdir(self._path('leased')):
+            lease_path = self._path('leased', name)
+            try:
+                stat = os.stat(lease_path)
+            except FileNotFoundError:
+                continue
+            if now - max(stat.st_mtime, stat.st_ctime) < self.lease_timeout:
+                continue
+            # Move the lease out of the way first, so only one process reclaims it
+            claim_path = self._path('tmp', f"{name}.reclaim.{default_worker_id()}")
+            try:
+                os.rename(lease_path, claim_path)
+            except FileNotFoundError:
+                continue
+            task_name, _, worker_id = name.partition('@')
+            try:
+                task = self._read(claim_path)
+            except (OSError, ValueError) as e:
+                logger.error(f"Dropping unreadable lease {name}: {e}")
+                os.replace(claim_path, self._path('failed', task_name))
+                continue
+            state = self.retry_or_fail(claim_path, task, f"lease expired on worker {worker_id}")
+            logger.warning(f"Reclaimed {task['task_id']} from unresponsive worker {worker_id} -> {state}")
+            reclaimed += 1
+        return reclaimed
+
+    def collect(self, state, task_ids):
+        """Read and remove the results in done/ or failed/ of the given task ids; returns a list of payloads.
+
+        Results of other tasks (e.g. finished by workers after their coordinator was aborted) are
+        logged once and left in place.
+        """
+        payloads = []
+        for name in sorted(os.listdir(self._path(state))):
+            path = self._path(state, name)
+            if name.rpartition('.json')[0] not in task_ids:
+                if path not in self.ignored:
+                    logger.warning(f"Keeping {state} entry {name}, it is not a task of this run")
+                    self.ignored.add(path)
+                continue
+            try:
+                payloads.append(self._read(path))
+            except (OSError, ValueError) as e:
+                logger.error(f"Unreadable {state} entry {name}: {e}")
+                continue
+            os.remove(path)
+        return payloads
+
+    def status(self):
+        """Cluster-wide view: number of tasks per state and the workers currently holding leases."""
+        leased = os.listdir(self._path('leased'))
+        workers = {}
+        for name in leased:
+            worker_id = name.partition('@')[2]
+            workers[worker_id] = workers.get(worker_id, 0) + 1
+        return {
+            'pending': len([n for n in os.listdir(self._path('pending')) if n.endswith('.json')]),
+            'leased': len(leased),
+            'done': len(os.listdir(self._path('done'))),
+            'failed': len(os.listdir(self._path('failed'))),
+            'workers': workers,
+        }